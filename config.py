@@ -15,17 +15,29 @@ GROQ_API_KEY = GROQ_API_KEY_LARGE or GROQ_API_KEY_SMALL
 
 MODEL_SIMPLE = "llama-3.1-8b-instant"
 MODEL_COMPLEX = "llama-3.3-70b-versatile"
+MODEL_EXTRACTIVE = "extractive"  # reported when the deadline left no time for an LLM
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PDF_DIR = os.path.join(BASE_DIR, "rag", "ClearPath", "clearpath_docs")
 INDEX_DIR = os.path.join(BASE_DIR, "rag", "index_store")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 ROUTER_LOG_FILE = os.path.join(LOG_DIR, "router_logs.jsonl")
+# Simulated (fake LLM) traffic is logged here, never to ROUTER_LOG_FILE.
+REPLAY_LOG_FILE = os.getenv("REPLAY_LOG_FILE", os.path.join(LOG_DIR, "replay_router_logs.jsonl"))
+ROUTING_TABLE_FILE = os.path.join(BASE_DIR, "router", "routing_table.json")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")   # memory | sqlite
+CONVERSATION_DB_FILE = os.path.join(DATA_DIR, "conversations.sqlite3")
 
 CHUNK_SIZE_WORDS = 350          
 CHUNK_OVERLAP_WORDS = 50        
 TOP_K_CHUNKS = 5                
 
+BM25_K1 = 1.5                   
+BM25_B = 0.75                   
+BM25_EPSILON = 0.25             # floor for negative IDFs, as in rank_bm25
+
 INTERNAL_DOC_PREFIXES = [
     "01_Employee_Handbook",
     "02_Data_Security_Privacy_Policy",
@@ -37,3 +49,57 @@ INTERNAL_DOC_PREFIXES = [
     "24_Weekly_Standup_Notes",
     "25_Product_Roadmap_2024",
 ]
+
+SHARD_DIR = os.path.join(INDEX_DIR, "shards")
+SHARD_DEFAULT_GROUP = "product"
+SHARD_GROUPS = {                # shard name → filename prefixes it owns
+    "sales": ["14_Pricing_Sheet", "15_Enterprise_Plan", "16_Feature_Comparison"],
+    "support": ["17_FAQ", "18_Onboarding", "19_Support_SLA", "20_Troubleshooting",
+                "21_Account_Management"],
+    "developer": ["26_API_Documentation", "27_Webhook", "28_System_Architecture",
+                  "29_Deployment", "30_Release_Notes"],
+    "internal": list(INTERNAL_DOC_PREFIXES),
+}
+RETRIEVAL_THREADS = 4           
+INDEX_ADMIN_TOKEN = os.getenv("INDEX_ADMIN_TOKEN", "")    # "" = index admin endpoints off
+
+MINHASH_NUM_PERM = 64           
+MINHASH_SHINGLE = 3             
+MINHASH_BANDS = 16              # 16 bands × 4 rows ≈ 0.5 similarity LSH cut-off
+DEDUP_THRESHOLD = 0.8           # estimated Jaccard at which chunks are collapsed
+MMR_LAMBDA = 0.5                
+MMR_CANDIDATE_FACTOR = 3        # MMR re-ranks the top TOP_K × factor chunks
+
+TOKEN_STEMMING = False          # changing this requires `python -m rag.ingest --force`
+TOKEN_CACHE_MAX = 200_000       # per-word stem memo / query term-id cache bound
+
+SNIPPET_WORDS_PER_CHUNK = 120   
+SNIPPET_MAX_SENTENCE_WORDS = 40 
+SNIPPET_NEIGHBOR_SENTENCES = 1  
+
+EXPANSION_MAX_TERMS = 5         
+EXPANSION_WEIGHT = 0.5          
+EXPANSION_DECAY = 0.5           
+EXPANSION_ASSISTANT_WEIGHT = 0.3
+EXPANSION_MAX_CONVERSATIONS = 10_000   # LRU bound on cached per-conversation term vectors
+
+ROUTER_P95_SLO_MS = int(os.getenv("ROUTER_P95_SLO_MS", "0"))   # 0 = disabled
+ROUTER_LATENCY_WINDOW = 100
+ROUTER_LATENCY_MIN_SAMPLES = 20
+ROUTER_LATENCY_MAX_AGE_S = 300  # latency samples older than this are dropped
+ROUTER_SLO_PROBE_EVERY = 20     # while overflowing, send 1 in N complex queries to 70B
+
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "10000"))
+DEADLINE_MAX_MS = 30000         
+DEADLINE_RESERVE_MS = 150       # kept back for evaluate + log
+DEADLINE_SMALL_MODEL_MS = 4000  # below this, complex queries use the 8B model
+DEADLINE_REDUCED_CONTEXT_MS = 2500
+DEADLINE_EXTRACTIVE_MS = 800    # below this, skip the LLM entirely
+DEGRADED_TOP_K_CHUNKS = 2
+EXTRACTIVE_ANSWER_CHUNKS = 3
+
+PROFILE_DIR = os.path.join(LOG_DIR, "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))   # 0 = off
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")          # "" = header/admin off
+PROFILE_MAX_FILES = 20          # ring size; oldest profile is deleted first
+PROFILE_TOP_ALLOCATIONS = 25
@@ -12,6 +12,11 @@ Implemented flags
                            Internal Operations docs AND the query was classified
                            as "simple" (a basic customer question should not
                            surface internal HR/ops content).
+4. "degraded_*"          – The request deadline forced a cheaper path:
+                           "degraded_small_model", "degraded_reduced_context"
+                           or "degraded_extractive" (LLM skipped or timed out),
+                           plus "degraded_upstream_error" when the LLM call
+                           failed upstream (e.g. 429 / 5xx after retries).
 """
 
 from __future__ import annotations
@@ -19,7 +24,7 @@ from __future__ import annotations
 import os
 import re
 import sys
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from config import INTERNAL_DOC_PREFIXES
@@ -57,6 +62,7 @@ def evaluate(
     chunks_retrieved: int,
     sources: List[Dict[str, Any]],
     classification: str,
+    degradations: Optional[List[str]] = None,
 ) -> List[str]:
     """
     Inspect the LLM answer and context to produce a list of flag strings.
@@ -71,6 +77,9 @@ def evaluate(
         The source dicts returned to the caller (each has a ``document`` key).
     classification : str
         The router classification ("simple" or "complex").
+    degradations : list[str], optional
+        Deadline fallbacks applied while serving the request
+        ("small_model", "reduced_context", "extractive").
 
     Returns
     -------
@@ -92,4 +101,7 @@ def evaluate(
         if internal_sources:
             flags.append("internal_data_leak")
 
+    for step in degradations or []:
+        flags.append(f"degraded_{step}")
+
     return flags
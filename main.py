@@ -4,6 +4,26 @@ ClearPath Chatbot – FastAPI Application
 Exposes:
   POST /query   →  main chat endpoint (matches API_CONTRACT.md)
   GET  /health  →  liveness check
+  GET  /admin/profiles             →  list captured request profiles
+  GET  /admin/profiles/{filename}  →  download a .prof / .json profile
+  POST /admin/shards/{name}/reload →  re-read one index shard from disk
+                                     (INDEX_ADMIN_TOKEN; single-process only)
+
+Every /query response carries a ``Server-Timing`` header with the time
+spent in each pipeline stage (route, retrieve, snippets, llm, store,
+evaluate, log), which tools/replay.py aggregates into per-stage percentiles.
+
+Each request runs against a deadline (REQUEST_DEADLINE_MS, or the
+``X-Deadline-Ms`` header capped at DEADLINE_MAX_MS).  As the remaining
+budget shrinks the pipeline degrades step by step — 8B model instead of
+70B, fewer chunks, and finally an extractive answer built from the top
+snippets without calling the LLM.  There are no per-stage budgets: the
+LLM call gets everything left except DEADLINE_RESERVE_MS (kept for
+evaluate + log), measured against the absolute deadline so time spent
+waiting for a worker thread counts too.  A timeout or an upstream error
+that survives the client's retries also falls back to the extractive
+answer.  Every fallback taken is reported as a ``degraded_*`` evaluator
+flag.
 
 Start with:
     uvicorn main:app --reload --port 8000
@@ -11,24 +31,60 @@ Start with:
 
 from __future__ import annotations
 
+import hmac
 import os
 import sys
 import time
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+import anyio
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from groq import APIConnectionError, APIStatusError
 from pydantic import BaseModel, Field
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from rag.retrieval import retrieve, reload_index
+from rag.retrieval import retrieve, reload_index, reload_shard, index_info
+from rag.snippets import compress_chunks, build_extractive_answer
+from rag.query_expansion import expand_query, folded_messages
 from rag.database import index_exists
 from rag.ingest import build_index
-from router.classifier import route_query, log_request
+from router.classifier import route_query, log_request, record_latency
 from evaluator.checks import evaluate
 from models.groq_client import generate_answer
+from store.conversation_store import get_history, append_exchange
+from profiling.request_profiler import (
+    ProfileSession,
+    start_profile,
+    is_admin,
+    list_profiles,
+    profile_path,
+)
+from config import (
+    MODEL_SIMPLE,
+    MODEL_EXTRACTIVE,
+    CONVERSATION_BACKEND,
+    INDEX_ADMIN_TOKEN,
+    TOP_K_CHUNKS,
+    REQUEST_DEADLINE_MS,
+    DEADLINE_MAX_MS,
+    DEADLINE_RESERVE_MS,
+    DEADLINE_SMALL_MODEL_MS,
+    DEADLINE_REDUCED_CONTEXT_MS,
+    DEADLINE_EXTRACTIVE_MS,
+    DEGRADED_TOP_K_CHUNKS,
+)
+
+# Earlier messages passed to the LLM with each question.
+LLM_HISTORY_MESSAGES = 6
+
+# Pre-forked workers sharing this app (set by serve.py before forking).
+# Per-process admin actions are refused when there is more than one.
+PREFORK_WORKERS = 1
 
 
 app = FastAPI(
@@ -59,6 +115,13 @@ async def startup_event():
     else:
         print("⚡ BM25 index loaded from disk.")
 
+    # serve.py sets PREFORK_WORKERS; uvicorn takes its default --workers
+    # from WEB_CONCURRENCY (an explicit --workers flag is not visible here).
+    workers = max(PREFORK_WORKERS, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+    if CONVERSATION_BACKEND != "sqlite" and workers > 1:
+        print("⚠️ CONVERSATION_BACKEND=memory keeps history per worker process; "
+              "set CONVERSATION_BACKEND=sqlite when running more than one worker.")
+
 
 
 class QueryRequest(BaseModel):
@@ -78,6 +141,7 @@ class MetadataResponse(BaseModel):
     latency_ms: int
     chunks_retrieved: int
     evaluator_flags: List[str]
+    context_compression: float = 1.0
 
 
 class SourceResponse(BaseModel):
@@ -94,41 +158,138 @@ class QueryResponse(BaseModel):
 
 
 
-_conversations: Dict[str, List[Dict[str, str]]] = {}
+def _lap(timings: Dict[str, float], stage: str, since: float) -> float:
+    now = time.perf_counter()
+    timings[stage] = (now - since) * 1000
+    return now
+
+
+def _server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={ms:.2f}" for stage, ms in timings.items())
 
 
+def _remaining_ms(deadline: float) -> float:
+    return (deadline - time.perf_counter()) * 1000
+
 
 @app.post("/query", response_model=QueryResponse)
-async def query_endpoint(req: QueryRequest):
-   
+async def query_endpoint(
+    req: QueryRequest,
+    response: Response,
+    x_deadline_ms: Optional[int] = Header(default=None),
+    x_profile: Optional[str] = Header(default=None),
+):
+    profile = start_profile(x_profile)
+    if profile is None:
+        return await _answer_query(req, response, x_deadline_ms, {}, None)
+
+    timings: Dict[str, float] = {}
+    result: Optional[QueryResponse] = None
+    try:
+        result = await _answer_query(req, response, x_deadline_ms, timings, profile)
+        response.headers["X-Profile-Id"] = profile.id
+        return result
+    finally:
+        profile.finish(timings, {
+            "question": req.question,
+            "conversation_id": result.conversation_id if result else req.conversation_id,
+            "response": result.metadata.model_dump() if result else None,
+        })
+
+
+def _load_turns(
+    conv_id: str, folded: int
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """(messages not yet folded into query expansion, recent messages for the LLM)."""
+    new_messages = get_history(conv_id, since=folded)
+    if folded == 0 or len(new_messages) >= LLM_HISTORY_MESSAGES:
+        return new_messages, new_messages[-LLM_HISTORY_MESSAGES:]
+    return new_messages, get_history(conv_id, limit=LLM_HISTORY_MESSAGES)
+
+
+async def _answer_query(
+    req: QueryRequest,
+    response: Response,
+    x_deadline_ms: Optional[int],
+    timings: Dict[str, float],
+    profile: Optional[ProfileSession],
+) -> QueryResponse:
     start = time.perf_counter()
+    budget_ms = min(x_deadline_ms or REQUEST_DEADLINE_MS, DEADLINE_MAX_MS)
+    deadline = start + budget_ms / 1000
+    degradations: List[str] = []
 
     conv_id = req.conversation_id or f"conv_{uuid.uuid4().hex[:12]}"
 
     routing = route_query(req.question)
     classification = routing["classification"]
     model = routing["model"]
-
-    chunks = retrieve(req.question)
+    lap = _lap(timings, "route", start)
+
+    # Only turns the expansion state has not folded in yet are loaded.
+    folded = folded_messages(conv_id)
+    new_messages, history = await run_in_threadpool(_load_turns, conv_id, folded)
+    expansion = expand_query(conv_id, req.question, new_messages, offset=folded)
+    top_k = TOP_K_CHUNKS
+    if _remaining_ms(deadline) < DEADLINE_REDUCED_CONTEXT_MS:
+        top_k = DEGRADED_TOP_K_CHUNKS
+        degradations.append("reduced_context")
+    chunks = retrieve(req.question, top_k=top_k, expansion=expansion)
     chunks_retrieved = len(chunks)
+    lap = _lap(timings, "retrieve", lap)
 
-    history = _conversations.get(conv_id, [])
-    llm_result = generate_answer(
-        question=req.question,
-        chunks=chunks,
-        model=model,
-        conversation_history=history[-6:], 
+    snippets, compression = compress_chunks(
+        req.question, chunks, extra_terms=expansion
     )
+    lap = _lap(timings, "snippets", lap)
+
+    llm_budget_ms = _remaining_ms(deadline) - DEADLINE_RESERVE_MS
+    call_llm = llm_budget_ms >= DEADLINE_EXTRACTIVE_MS
+    if call_llm and llm_budget_ms < DEADLINE_SMALL_MODEL_MS and model != MODEL_SIMPLE:
+        model = MODEL_SIMPLE
+        degradations.append("small_model")
+
+    llm_result = None
+    if call_llm:
+        # Absolute deadline, so time spent queued for a worker thread
+        # counts against it; the await itself is bounded the same way.
+        llm_deadline = deadline - DEADLINE_RESERVE_MS / 1000
+        try:
+            llm_call = generate_answer if profile is None else profile.wrap(generate_answer)
+            with anyio.fail_after(max(llm_deadline - time.perf_counter(), 0.0)):
+                llm_result = await run_in_threadpool(
+                    llm_call,
+                    question=req.question,
+                    chunks=snippets,
+                    model=model,
+                    conversation_history=history,
+                    deadline=llm_deadline,
+                )
+        except TimeoutError:
+            llm_result = None
+        except (APIConnectionError, APIStatusError):
+            # Upstream failure after the client's own retries.
+            degradations.append("upstream_error")
+            llm_result = None
+    lap = _lap(timings, "llm", lap)
+    if call_llm:
+        record_latency(model, int(timings["llm"]))
+
+    if llm_result is None:
+        # No LLM produced the answer; never report it as a model call.
+        model = MODEL_EXTRACTIVE
+        degradations.append("extractive")
+        llm_result = {
+            "answer": build_extractive_answer(snippets),
+            "tokens_input": 0,
+            "tokens_output": 0,
+        }
     answer = llm_result["answer"]
     tokens_in = llm_result["tokens_input"]
     tokens_out = llm_result["tokens_output"]
 
-    _conversations.setdefault(conv_id, []).append(
-        {"role": "user", "content": req.question}
-    )
-    _conversations[conv_id].append(
-        {"role": "assistant", "content": answer}
-    )
+    await run_in_threadpool(append_exchange, conv_id, req.question, answer)
+    lap = _lap(timings, "store", lap)
 
     sources = [
         {
@@ -144,7 +305,9 @@ async def query_endpoint(req: QueryRequest):
         chunks_retrieved=chunks_retrieved,
         sources=sources,
         classification=classification,
+        degradations=degradations,
     )
+    lap = _lap(timings, "evaluate", lap)
 
     latency_ms = int((time.perf_counter() - start) * 1000)
 
@@ -155,7 +318,11 @@ async def query_endpoint(req: QueryRequest):
         tokens_input=tokens_in,
         tokens_output=tokens_out,
         latency_ms=latency_ms,
+        evaluator_flags=flags,
+        routed_by=routing["routed_by"],
     )
+    _lap(timings, "log", lap)
+    response.headers["Server-Timing"] = _server_timing(timings)
 
     return QueryResponse(
         answer=answer,
@@ -166,6 +333,7 @@ async def query_endpoint(req: QueryRequest):
             latency_ms=latency_ms,
             chunks_retrieved=chunks_retrieved,
             evaluator_flags=flags,
+            context_compression=compression,
         ),
         sources=[SourceResponse(**s) for s in sources],
         conversation_id=conv_id,
@@ -174,4 +342,65 @@ async def query_endpoint(req: QueryRequest):
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "index_ready": index_exists()}
+    if not index_exists():
+        return {"status": "ok", "index_ready": False}
+    return {
+        "status": "ok",
+        "index_ready": True,
+        "index_version": index_info()["version"],
+        "pid": os.getpid(),
+    }
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not is_admin(token):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+def _require_index_admin(token: Optional[str]) -> None:
+    # Separate from PROFILE_ADMIN_TOKEN: enabling profiling must not
+    # also enable index administration.
+    if not INDEX_ADMIN_TOKEN or token is None or not hmac.compare_digest(
+        token.encode("utf-8"), INDEX_ADMIN_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@app.get("/admin/profiles")
+async def admin_list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    return {"profiles": list_profiles()}
+
+
+@app.get("/admin/profiles/{filename}")
+async def admin_download_profile(
+    filename: str,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    _require_admin(x_admin_token)
+    path = profile_path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=filename)
+
+
+@app.post("/admin/shards/{name}/reload")
+async def admin_reload_shard(
+    name: str,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    _require_index_admin(x_admin_token)
+    if PREFORK_WORKERS > 1:
+        # Would only reach the worker that accepted this request.
+        raise HTTPException(
+            status_code=409,
+            detail="Shard reloads are per-process; restart serve.py to reload all workers",
+        )
+    try:
+        await run_in_threadpool(reload_shard, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    info = index_info()
+    return {"shard": name, "index_version": info["version"], "shards": info["shards"]}
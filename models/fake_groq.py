@@ -0,0 +1,108 @@
+"""
+ClearPath Chatbot – Deterministic Fake LLM Client
+===================================================
+Drop-in replacement for ``models.groq_client.generate_answer`` used by
+load tests and replays.  No network calls are made.
+
+Latency and token counts are drawn from the router log: for each model
+the fake keeps the logged (latency_ms, tokens_output) samples and picks
+one with a RNG seeded from (seed, model, question), so the same question
+always gets the same simulated cost.  Input tokens are estimated from the
+prompt size.  Rows served in a degraded mode (``degraded_*`` flags) are
+skipped.  Models with no logged samples fall back to built-in defaults.
+
+The call blocks with ``time.sleep`` exactly as the real SDK call blocks,
+and honours ``deadline`` (absolute ``time.perf_counter()`` value, measured
+when the call starts) by sleeping until it and raising ``TimeoutError``
+when the simulated latency would overrun it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import MODEL_SIMPLE, MODEL_COMPLEX, ROUTER_LOG_FILE
+
+
+# (latency_ms, tokens_output) used when the log has nothing for a model.
+_DEFAULT_SAMPLES: Dict[str, List[Tuple[int, int]]] = {
+    MODEL_SIMPLE: [(350, 120), (450, 160), (600, 220)],
+    MODEL_COMPLEX: [(1100, 180), (1500, 260), (2300, 380)],
+}
+
+# Rough words → tokens factor for the prompt estimate.
+_TOKENS_PER_WORD = 1.3
+_SYSTEM_PROMPT_TOKENS = 120
+
+
+def load_samples(log_file: str = ROUTER_LOG_FILE) -> Dict[str, List[Tuple[int, int]]]:
+    samples: Dict[str, List[Tuple[int, int]]] = {}
+    if os.path.isfile(log_file):
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                model = row.get("model_used")
+                flags = row.get("evaluator_flags") or []
+                if any(str(f).startswith("degraded_") for f in flags):
+                    # Deadline fallbacks are not representative model calls.
+                    continue
+                if model and "latency_ms" in row:
+                    samples.setdefault(model, []).append(
+                        (int(row["latency_ms"]), int(row.get("tokens_output", 0)))
+                    )
+    for model, default in _DEFAULT_SAMPLES.items():
+        samples.setdefault(model, default)
+    return samples
+
+
+def make_generate_answer(
+    samples: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+    seed: int = 0,
+    latency_scale: float = 1.0,
+) -> Callable[..., Dict[str, Any]]:
+    if samples is None:
+        samples = load_samples()
+
+    def generate_answer(
+        question: str,
+        chunks: List[Dict[str, Any]],
+        model: str,
+        conversation_history: List[Dict[str, str]] | None = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        key = f"{seed}\x00{model}\x00{question}".encode("utf-8")
+        rng = random.Random(zlib.crc32(key))
+        pool = samples.get(model) or _DEFAULT_SAMPLES[MODEL_COMPLEX]
+        latency_ms, tokens_out = pool[rng.randrange(len(pool))]
+
+        words = len(question.split())
+        words += sum(len(c["text"].split()) for c in chunks)
+        words += sum(len(m["content"].split()) for m in conversation_history or [])
+        tokens_in = _SYSTEM_PROMPT_TOKENS + int(words * _TOKENS_PER_WORD)
+
+        delay = latency_ms * latency_scale / 1000
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            if delay > remaining:
+                time.sleep(max(remaining, 0.0))
+                raise TimeoutError(f"{model} did not answer within {max(remaining, 0.0):.2f}s")
+        time.sleep(delay)
+
+        sources = ", ".join(sorted({c["source"] for c in chunks})) or "no documents"
+        return {
+            "answer": f"[simulated {model}] Answer based on {sources}.",
+            "tokens_input": tokens_in,
+            "tokens_output": tokens_out,
+        }
+
+    return generate_answer
@@ -10,15 +10,21 @@ from __future__ import annotations
 
 import os
 import sys
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from config import GROQ_API_KEY
 
-from groq import Groq
+from groq import Groq, APIConnectionError, APIStatusError, APITimeoutError
 
 _client = Groq(api_key=GROQ_API_KEY)
 
+# Retries within a deadline mirror the SDK defaults (2 retries, doubling
+# backoff) but never sleep past the deadline.
+_MAX_RETRIES = 2
+_RETRY_BACKOFF_S = 0.5
+
 _SYSTEM_PROMPT = (
     "You are ClearPath Support Assistant, a helpful customer support chatbot "
     "for ClearPath — a modern project management SaaS platform.\n\n"
@@ -45,13 +51,52 @@ def _build_context_block(chunks: List[Dict[str, Any]]) -> str:
 
 
 
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def _create_within(deadline: float, **request: Any) -> Any:
+    attempt = 0
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TimeoutError(f"{request['model']} deadline passed before the call started")
+        client = _client.with_options(timeout=remaining, max_retries=0)
+        try:
+            return client.chat.completions.create(**request)
+        except APITimeoutError as e:
+            raise TimeoutError(f"{request['model']} did not answer within {remaining:.2f}s") from e
+        except (APIConnectionError, APIStatusError) as e:
+            backoff = _RETRY_BACKOFF_S * 2 ** attempt
+            if (
+                not _retryable(e)
+                or attempt >= _MAX_RETRIES
+                or time.perf_counter() + backoff >= deadline
+            ):
+                raise
+            attempt += 1
+            time.sleep(backoff)
+
+
 def generate_answer(
     question: str,
     chunks: List[Dict[str, Any]],
     model: str,
     conversation_history: List[Dict[str, str]] | None = None,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
-   
+    """
+    Call the model and return the answer with token counts.
+
+    *deadline* is an absolute ``time.perf_counter()`` value.  The time left
+    is measured when the call actually starts (not when it was queued for
+    a worker thread); each attempt is bounded by it, transient failures
+    (connection errors, 408/409/429/5xx) are retried only while the
+    deadline allows, and ``TimeoutError`` is raised once it passes.
+    Other API errors propagate as the SDK's exceptions.
+    """
     context = _build_context_block(chunks)
 
     messages: List[Dict[str, str]] = [{"role": "system", "content": _SYSTEM_PROMPT}]
@@ -68,13 +113,11 @@ def generate_answer(
     )
     messages.append({"role": "user", "content": user_message})
 
- 
-    response = _client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.3,
-        max_tokens=1024,
-    )
+    request = dict(model=model, messages=messages, temperature=0.3, max_tokens=1024)
+    if deadline is None:
+        response = _client.chat.completions.create(**request)
+    else:
+        response = _create_within(deadline, **request)
 
     choice = response.choices[0]
     usage = response.usage
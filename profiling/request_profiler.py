@@ -0,0 +1,199 @@
+"""
+ClearPath Chatbot – Opt-In Request Profiler
+=============================================
+Captures cProfile + tracemalloc data for selected /query requests.
+
+A request is profiled when either:
+  • it sends ``X-Profile: <PROFILE_ADMIN_TOKEN>``, or
+  • it is picked by PROFILE_SAMPLE_RATE (fraction of requests, 0 = never).
+
+With both disabled ``start_profile`` returns None after a single check,
+so unprofiled requests pay nothing.
+
+Only one request is profiled at a time per process (cProfile and
+tracemalloc are process/thread global); others arriving meanwhile are
+served unprofiled.  The event-loop profiler also sees work done for
+other requests while the profiled one awaits the LLM, so read the
+per-stage timings in the summary alongside the call stats.
+
+Each profile is written to PROFILE_DIR as:
+  <id>.prof  – pstats dump (``python -m pstats``, snakeviz, …)
+  <id>.json  – stage timings, request metadata, peak memory and the top
+               PROFILE_TOP_ALLOCATIONS allocation sites
+Only the newest PROFILE_MAX_FILES profiles are kept.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import (
+    PROFILE_DIR,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_ADMIN_TOKEN,
+    PROFILE_MAX_FILES,
+    PROFILE_TOP_ALLOCATIONS,
+)
+
+
+_active = threading.Lock()
+_ring_lock = threading.Lock()
+
+
+def is_admin(token: Optional[str]) -> bool:
+    # Compare bytes: compare_digest rejects non-ASCII str with TypeError.
+    return bool(PROFILE_ADMIN_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode("utf-8"), PROFILE_ADMIN_TOKEN.encode("utf-8")
+    )
+
+
+class ProfileSession:
+    def __init__(self, trigger: str) -> None:
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.trigger = trigger
+        self._stats: Optional[pstats.Stats] = None
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Profile *func* in whichever thread it ends up running in."""
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                # Python 3.12+: the request's profiler is interpreter-wide
+                # and already sees this thread.
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                prof.disable()
+                self._merge(prof)
+        return profiled
+
+    def _merge(self, prof: cProfile.Profile) -> None:
+        with _ring_lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(prof)
+            else:
+                self._stats.add(prof)
+
+    def finish(self, timings: Dict[str, float], metadata: Dict[str, Any]) -> None:
+        try:
+            self._profiler.disable()
+            self._merge(self._profiler)
+
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+            top = snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]
+            summary = {
+                "id": self.id,
+                "trigger": self.trigger,
+                "created": int(time.time()),
+                "pid": os.getpid(),
+                "stages_ms": {k: round(v, 2) for k, v in timings.items()},
+                "metadata": metadata,
+                "peak_memory_bytes": peak,
+                "top_allocations": [
+                    {"site": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                    for stat in top
+                ],
+            }
+            _write(self.id, self._stats, summary)
+        finally:
+            _active.release()
+
+
+def start_profile(header_token: Optional[str]) -> Optional[ProfileSession]:
+    if header_token is None and PROFILE_SAMPLE_RATE <= 0:
+        return None
+
+    if is_admin(header_token):
+        trigger = "header"
+    elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        trigger = "sample"
+    else:
+        return None
+
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        return ProfileSession(trigger)
+    except Exception:
+        # Another profiler (e.g. a debugger) owns the hooks; never fail the request.
+        _active.release()
+        return None
+
+
+def _write(profile_id: str, stats: Optional[pstats.Stats], summary: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if stats is not None:
+            stats.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        _trim_ring()
+    except OSError:
+        pass
+
+
+def _trim_ring() -> None:
+    ids = sorted({os.path.splitext(name)[0] for name in os.listdir(PROFILE_DIR)})
+    excess = len(ids) - PROFILE_MAX_FILES
+    for stale in ids[:max(excess, 0)]:
+        for ext in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stale + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles: List[Dict[str, Any]] = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        profiles.append({
+            "id": summary.get("id"),
+            "trigger": summary.get("trigger"),
+            "created": summary.get("created"),
+            "stages_ms": summary.get("stages_ms"),
+            "peak_memory_bytes": summary.get("peak_memory_bytes"),
+        })
+    return profiles
+
+
+def profile_path(filename: str) -> Optional[str]:
+    """Resolve a downloadable profile file, refusing anything outside PROFILE_DIR."""
+    ext = os.path.splitext(filename)[1]
+    if ext not in (".prof", ".json") or os.path.basename(filename) != filename:
+        return None
+    path = os.path.join(PROFILE_DIR, filename)
+    return path if os.path.isfile(path) else None
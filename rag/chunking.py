@@ -18,7 +18,7 @@ from __future__ import annotations
 
 import os
 import re
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 
 import fitz 
 
@@ -97,12 +97,15 @@ def chunk_pages(
     return chunks
 
 
-def process_all_pdfs(pdf_dir: str = PDF_DIR) -> List[Dict[str, Any]]:
+def process_all_pdfs(
+    pdf_dir: str = PDF_DIR,
+    include: Optional[Callable[[str], bool]] = None,
+) -> List[Dict[str, Any]]:
     
     all_chunks: List[Dict[str, Any]] = []
     pdf_files = sorted(
         f for f in os.listdir(pdf_dir)
-        if f.lower().endswith(".pdf")
+        if f.lower().endswith(".pdf") and (include is None or include(f))
     )
 
     for filename in pdf_files:
@@ -4,25 +4,43 @@ ClearPath Chatbot – Database / Persistence Layer
 Saves and loads:
   • The list of chunk dicts  →  JSON
   • The BM25 index object   →  pickle
+  • MinHash signatures      →  .npy
 
 Everything is stored under  backend/rag/index_store/
+
+Sharded layout (``python -m rag.ingest --sharded``): one directory per
+document group holding that shard's chunks, tokenised corpus and
+signatures.  ``index_store/shards/<name>`` is a symlink to the current
+build (``.<name>@<id>/``); a rebuild writes a new directory and swaps the
+link with a single rename, so readers always see either the old or the
+new shard.  The previous build is kept until the next rebuild so a
+reader that resolved the old link can finish.
+
+The sharded layout is only used when every document group has a shard
+(``active_shards``); otherwise the monolithic index is served.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import pickle
+import shutil
+import uuid
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from config import INDEX_DIR
+from config import INDEX_DIR, SHARD_DIR, SHARD_GROUPS, SHARD_DEFAULT_GROUP
 
 
 CHUNKS_FILE = os.path.join(INDEX_DIR, "chunks.json")
 BM25_INDEX_FILE = os.path.join(INDEX_DIR, "bm25_index.pkl")
 TOKENIZED_CORPUS_FILE = os.path.join(INDEX_DIR, "tokenized_corpus.pkl")
+SIGNATURES_FILE = os.path.join(INDEX_DIR, "minhash_signatures.npy")
 
 
 def _ensure_dir() -> None:
@@ -68,5 +86,146 @@ def load_bm25_index():
 
 
 
+def save_signatures(signatures: np.ndarray) -> str:
+    _ensure_dir()
+    np.save(SIGNATURES_FILE, signatures)
+    print(f"  💾 Saved {len(signatures)} MinHash signatures → {SIGNATURES_FILE}")
+    return SIGNATURES_FILE
+
+
+def load_signatures() -> Optional[np.ndarray]:
+    if not os.path.isfile(SIGNATURES_FILE):
+        return None
+    return np.load(SIGNATURES_FILE)
+
+
+
+def _shard_path(name: str) -> str:
+    return os.path.join(SHARD_DIR, name)
+
+
+def expected_shards() -> List[str]:
+    return sorted({*SHARD_GROUPS, SHARD_DEFAULT_GROUP})
+
+
+def list_shards() -> List[str]:
+    """Shards present on disk (possibly an incomplete set)."""
+    if not os.path.isdir(SHARD_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(SHARD_DIR)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(_shard_path(name), "chunks.json"))
+    )
+
+
+def active_shards() -> List[str]:
+    """The shards to serve, or [] when the sharded layout is incomplete."""
+    present = set(list_shards())
+    expected = expected_shards()
+    if not present or not present.issuperset(expected):
+        return []
+    return expected
+
+
+def missing_shards() -> List[str]:
+    present = set(list_shards())
+    return [name for name in expected_shards() if name not in present]
+
+
+def save_shard(
+    name: str,
+    chunks: List[Dict[str, Any]],
+    tokenized_corpus: List[List[str]],
+    signatures: np.ndarray,
+) -> str:
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    final = _shard_path(name)
+    build = f".{name}@{uuid.uuid4().hex[:12]}"
+    staging = os.path.join(SHARD_DIR, build)
+    os.makedirs(staging)
+
+    with open(os.path.join(staging, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(staging, "tokenized_corpus.pkl"), "wb") as f:
+        pickle.dump(tokenized_corpus, f)
+    np.save(os.path.join(staging, "minhash_signatures.npy"), signatures)
+
+    previous = os.readlink(final) if os.path.islink(final) else None
+    if os.path.isdir(final) and previous is None:
+        # Plain directory from an older layout: retire it once.
+        previous = f".{name}@legacy"
+        shutil.rmtree(os.path.join(SHARD_DIR, previous), ignore_errors=True)
+        os.replace(final, os.path.join(SHARD_DIR, previous))
+
+    link_tmp = os.path.join(SHARD_DIR, f".{name}.link")
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(build, link_tmp)
+    os.replace(link_tmp, final)
+
+    # Keep the current and previous builds; drop anything older.
+    for entry in os.listdir(SHARD_DIR):
+        if entry.startswith(f".{name}@") and entry not in (build, previous):
+            shutil.rmtree(os.path.join(SHARD_DIR, entry), ignore_errors=True)
+
+    print(f"  💾 Saved shard '{name}' ({len(chunks)} chunks) → {final}")
+    return final
+
+
+def _digest(raw: bytes) -> str:
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def load_shard(name: str):
+    """
+    Return ``(chunks, tokenized_corpus, signatures, version)`` for one
+    shard, or all None when it does not exist.  *version* hashes the very
+    chunks.json bytes that were loaded, so it always describes this build.
+    """
+    # Resolve the link once so every file comes from the same build.
+    path = os.path.realpath(_shard_path(name))
+    if not os.path.isfile(os.path.join(path, "chunks.json")):
+        return None, None, None, None
+    with open(os.path.join(path, "chunks.json"), "rb") as f:
+        raw = f.read()
+    chunks = json.loads(raw.decode("utf-8"))
+    with open(os.path.join(path, "tokenized_corpus.pkl"), "rb") as f:
+        tokenized_corpus = pickle.load(f)
+    sig_file = os.path.join(path, "minhash_signatures.npy")
+    signatures = np.load(sig_file) if os.path.isfile(sig_file) else None
+    return chunks, tokenized_corpus, signatures, _digest(raw)
+
+
+def shard_version(name: str) -> str:
+    path = os.path.join(os.path.realpath(_shard_path(name)), "chunks.json")
+    if not os.path.isfile(path):
+        return _digest(b"")
+    with open(path, "rb") as f:
+        return _digest(f.read())
+
+
+def combine_shard_versions(versions: Dict[str, str]) -> str:
+    digest = hashlib.sha1()
+    for name in sorted(versions):
+        digest.update(f"{name}:{versions[name]};".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+
+def index_version() -> str:
+    shards = active_shards()
+    if shards:
+        return combine_shard_versions({name: shard_version(name) for name in shards})
+    digest = hashlib.sha1()
+    for path in (CHUNKS_FILE, BM25_INDEX_FILE):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
 def index_exists() -> bool:
+    if active_shards():
+        return True
     return os.path.isfile(CHUNKS_FILE) and os.path.isfile(BM25_INDEX_FILE)
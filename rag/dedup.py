@@ -0,0 +1,139 @@
+"""
+ClearPath Chatbot – Near-Duplicate Detection
+==============================================
+MinHash signatures over word shingles, banded LSH for candidate pairs,
+and MMR re-ranking for query-time diversity.
+
+  • Ingest: every chunk gets a MINHASH_NUM_PERM-wide signature of its
+    MINHASH_SHINGLE-word shingles.  LSH (MINHASH_BANDS bands) proposes
+    candidate pairs; pairs whose estimated Jaccard similarity is at least
+    DEDUP_THRESHOLD are collapsed into the earliest chunk.
+  • Query: the top candidates are re-ranked with Maximal Marginal
+    Relevance, penalising chunks similar to ones already selected, using
+    the same precomputed signatures.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import zlib
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import (
+    MINHASH_NUM_PERM,
+    MINHASH_SHINGLE,
+    MINHASH_BANDS,
+    DEDUP_THRESHOLD,
+    MMR_LAMBDA,
+)
+
+
+_PRIME = np.uint64((1 << 31) - 1)
+_SEED = 1
+
+
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_PERM_A, _PERM_B = _permutations(MINHASH_NUM_PERM)
+
+
+def _shingle_hashes(tokens: Sequence[str], k: int) -> np.ndarray:
+    if len(tokens) < k:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    hashes = {zlib.crc32(g.encode("utf-8")) for g in grams}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % _PRIME
+
+
+def minhash(tokens: Sequence[str], k: int = MINHASH_SHINGLE) -> np.ndarray:
+    hashes = _shingle_hashes(tokens, k)
+    if hashes.size == 0:
+        return np.full(MINHASH_NUM_PERM, _PRIME, dtype=np.uint64)
+    # (a·h + b) mod p stays below 2^63 because a, b, h < 2^31.
+    perms = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME
+    return perms.min(axis=1)
+
+
+def minhash_batch(corpus: Sequence[Sequence[str]]) -> np.ndarray:
+    if not corpus:
+        return np.empty((0, MINHASH_NUM_PERM), dtype=np.uint64)
+    return np.vstack([minhash(tokens) for tokens in corpus])
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int = MINHASH_BANDS) -> Set[Tuple[int, int]]:
+    rows = signatures.shape[1] // bands
+    pairs: Set[Tuple[int, int]] = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        block = signatures[:, band * rows:(band + 1) * rows]
+        for doc_id, key in enumerate(block):
+            buckets.setdefault(key.tobytes(), []).append(doc_id)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def find_near_duplicates(
+    signatures: np.ndarray,
+    threshold: float = DEDUP_THRESHOLD,
+) -> Dict[int, int]:
+    """
+    Return ``{duplicate_idx: kept_idx}``; within each group of
+    near-duplicates the lowest index is kept.
+    """
+    parent = list(range(len(signatures)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in sorted(lsh_candidates(signatures)):
+        if similarity(signatures[i], signatures[j]) >= threshold:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+    return {i: find(i) for i in range(len(parent)) if find(i) != i}
+
+
+def mmr_select(
+    candidates: Sequence[int],
+    relevance: np.ndarray,
+    signatures: np.ndarray,
+    k: int,
+    lam: float = MMR_LAMBDA,
+) -> List[int]:
+    """
+    Pick *k* of *candidates* (doc indices, best first) by Maximal Marginal
+    Relevance: ``lam·relevance − (1 − lam)·max similarity to picked``.
+    *relevance* is indexed by doc id and should be normalised to [0, 1].
+    """
+    remaining = list(candidates)
+    picked: List[int] = []
+    max_sim = {c: 0.0 for c in remaining}
+    while remaining and len(picked) < k:
+        best = max(remaining, key=lambda c: lam * relevance[c] - (1 - lam) * max_sim[c])
+        picked.append(best)
+        remaining.remove(best)
+        for c in remaining:
+            max_sim[c] = max(max_sim[c], similarity(signatures[c], signatures[best]))
+    return picked
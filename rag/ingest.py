@@ -3,13 +3,19 @@ ClearPath Chatbot – Ingestion Pipeline
 ========================================
 Orchestrates:
   1.  PDF extraction + chunking   (chunking.py)
-  2.  Tokenisation of every chunk
-  3.  BM25 index construction      (rank_bm25)
-  4.  Persistence to disk          (database.py)
+  2.  Tokenisation of every chunk  (stemmed words memoised)
+  3.  Near-duplicate collapse      (MinHash + LSH, dedup.py)
+  4.  BM25 index construction      (rank_bm25)
+  5.  Persistence to disk          (database.py)
 
 Run this script once (or whenever the PDFs change) to rebuild the index:
 
     python -m rag.ingest          # from the backend/ directory
+
+Sharded layout (one index per document group, see SHARD_GROUPS):
+
+    python -m rag.ingest --sharded          # build every shard
+    python -m rag.ingest --shard sales      # rebuild just one shard
 """
 
 from __future__ import annotations
@@ -18,13 +24,32 @@ import os
 import re
 import sys
 import time
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from config import PDF_DIR
+from config import (
+    PDF_DIR,
+    TOKEN_STEMMING,
+    TOKEN_CACHE_MAX,
+    BM25_K1,
+    BM25_B,
+    BM25_EPSILON,
+    SHARD_GROUPS,
+    SHARD_DEFAULT_GROUP,
+)
 from rag.chunking import process_all_pdfs
-from rag.database import save_chunks, save_bm25_index, index_exists
+from rag.database import (
+    save_chunks,
+    save_bm25_index,
+    save_signatures,
+    save_shard,
+    expected_shards,
+    active_shards,
+    missing_shards,
+    index_exists,
+)
+from rag.dedup import minhash_batch, find_near_duplicates
 
 from rank_bm25 import BM25Okapi
 
@@ -40,10 +65,117 @@ _STOP_WORDS = frozenset(
 )
 
 
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# raw lower-cased word → normalised, interned token (None = dropped).
+# Only used with TOKEN_STEMMING: without it normalising is a set lookup and
+# a length check, which is as cheap as the cache lookup itself.
+_word_cache: Dict[str, Optional[str]] = {}
+
+
+def _stem(word: str) -> str:
+    # Conservative plural stripping (Harman's S-stemmer).
+    if len(word) > 3 and word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+def _normalise(word: str) -> Optional[str]:
+    if word in _STOP_WORDS or len(word) <= 1:
+        return None
+    if TOKEN_STEMMING:
+        word = _stem(word)
+    return sys.intern(word)
+
+
+def _lookup(word: str) -> Optional[str]:
+    if not TOKEN_STEMMING:
+        return _normalise(word)
+    try:
+        return _word_cache[word]
+    except KeyError:
+        pass
+    if len(_word_cache) >= TOKEN_CACHE_MAX:
+        _word_cache.clear()
+    token = _word_cache[word] = _normalise(word)
+    return token
+
+
+def clear_token_cache() -> None:
+    _word_cache.clear()
+
+
 def tokenize(text: str) -> List[str]:
-    tokens = re.findall(r"[a-z0-9]+", text.lower())
-    return [t for t in tokens if t not in _STOP_WORDS and len(t) > 1]
+    if not TOKEN_STEMMING:
+        return [
+            w for w in _TOKEN_RE.findall(text.lower())
+            if w not in _STOP_WORDS and len(w) > 1
+        ]
+    lookup = _lookup
+    out: List[str] = []
+    for word in _TOKEN_RE.findall(text.lower()):
+        token = lookup(word)
+        if token is not None:
+            out.append(token)
+    return out
+
 
+def encode(
+    text: str,
+    vocab: Dict[str, int],
+    id_cache: Optional[Dict[str, int]] = None,
+) -> List[int]:
+    """
+    Tokenise *text* straight to term ids of *vocab*, dropping terms the
+    index has never seen.  *id_cache* (raw word → id, -1 for unknown or
+    dropped) should be owned by the caller and reset whenever *vocab*
+    changes.
+    """
+    if id_cache is None:
+        id_cache = {}
+    ids: List[int] = []
+    for word in _TOKEN_RE.findall(text.lower()):
+        tid = id_cache.get(word)
+        if tid is None:
+            if len(id_cache) >= TOKEN_CACHE_MAX:
+                id_cache.clear()
+            token = _lookup(word)
+            tid = id_cache[word] = vocab.get(token, -1) if token is not None else -1
+        if tid >= 0:
+            ids.append(tid)
+    return ids
+
+
+
+def shard_for(filename: str) -> str:
+    for name, prefixes in SHARD_GROUPS.items():
+        if any(filename.startswith(p) for p in prefixes):
+            return name
+    return SHARD_DEFAULT_GROUP
+
+
+def _collapse_duplicates(
+    chunks: List[Dict[str, Any]],
+    tokenized_corpus: List[List[str]],
+) -> Tuple[List[Dict[str, Any]], List[List[str]], Any]:
+    signatures = minhash_batch(tokenized_corpus)
+    duplicates = find_near_duplicates(signatures)
+    for dup, kept in duplicates.items():
+        chunks[kept].setdefault("duplicates", []).append(
+            {"source": chunks[dup]["source"], "page": chunks[dup]["page"]}
+        )
+    keep = [i for i in range(len(chunks)) if i not in duplicates]
+    chunks = [chunks[i] for i in keep]
+    tokenized_corpus = [tokenized_corpus[i] for i in keep]
+    signatures = signatures[keep]
+    for idx, chunk in enumerate(chunks):
+        chunk["chunk_id"] = idx
+    print(f"  Removed {len(duplicates)} near-duplicate chunk(s)")
+    return chunks, tokenized_corpus, signatures
 
 
 def build_index(force: bool = False) -> None:
@@ -69,19 +201,66 @@ def build_index(force: bool = False) -> None:
     avg_tokens = sum(len(t) for t in tokenized_corpus) / len(tokenized_corpus)
     print(f"  Average tokens per chunk: {avg_tokens:.1f}")
 
-    print("\n📊 Step 3: Building BM25Okapi index …")
-    bm25 = BM25Okapi(tokenized_corpus)
+    print("\n🧬 Step 3: Collapsing near-duplicate chunks …")
+    chunks, tokenized_corpus, signatures = _collapse_duplicates(chunks, tokenized_corpus)
+
+    print("\n📊 Step 4: Building BM25Okapi index …")
+    bm25 = BM25Okapi(tokenized_corpus, k1=BM25_K1, b=BM25_B, epsilon=BM25_EPSILON)
     print("  ✓ BM25 index built")
 
-    print("\n💾 Step 4: Saving to disk …")
+    print("\n💾 Step 5: Saving to disk …")
     save_chunks(chunks)
     save_bm25_index(bm25, tokenized_corpus)
+    save_signatures(signatures)
 
     elapsed = time.perf_counter() - t0
     print(f"\n✅ Done in {elapsed:.2f}s  ({len(chunks)} chunks indexed)")
 
 
+def build_shards(names: Optional[List[str]] = None) -> None:
+    """
+    Build the named shards (all document groups when *names* is None).
+    Rebuilding individual shards requires a complete sharded layout, since
+    an incomplete one is never served.
+    """
+    known = expected_shards()
+    targets = names or known
+    unknown = [n for n in targets if n not in known]
+    if unknown:
+        print(f"❌ Unknown shard(s): {', '.join(unknown)}.  Known: {', '.join(known)}")
+        return
+    if names and not active_shards():
+        print(f"❌ No complete sharded index (missing: {', '.join(missing_shards())}).  "
+              f"Run `python -m rag.ingest --sharded` first.")
+        return
+
+    t0 = time.perf_counter()
+    for name in targets:
+        print("=" * 60)
+        print(f"  ClearPath – Building shard '{name}'")
+        print("=" * 60)
+
+        chunks = process_all_pdfs(PDF_DIR, include=lambda f, n=name: shard_for(f) == n)
+        if not chunks:
+            # Saved empty so the layout stays complete.
+            print(f"  ⚠️ No documents belong to shard '{name}'")
+        tokenized_corpus = [tokenize(c["text"]) for c in chunks]
+        chunks, tokenized_corpus, signatures = _collapse_duplicates(chunks, tokenized_corpus)
+        for chunk in chunks:
+            chunk["shard"] = name
+        save_shard(name, chunks, tokenized_corpus, signatures)
+
+    elapsed = time.perf_counter() - t0
+    print(f"\n✅ Done in {elapsed:.2f}s  ({len(targets)} shard(s))")
+
+
 
 if __name__ == "__main__":
-    force = "--force" in sys.argv
-    build_index(force=force)
+    if "--shard" in sys.argv:
+        i = sys.argv.index("--shard")
+        build_shards(sys.argv[i + 1:i + 2] or None)
+    elif "--sharded" in sys.argv:
+        build_shards()
+    else:
+        force = "--force" in sys.argv
+        build_index(force=force)
@@ -0,0 +1,150 @@
+"""
+ClearPath Chatbot – History-Aware Query Expansion
+===================================================
+Follow-up questions such as "what about Enterprise?" carry almost no
+retrievable terms on their own.  This module keeps a per-conversation
+bag of terms from earlier turns and merges the most salient ones into
+the BM25 query.
+
+  • Every turn is tokenised exactly once; the per-conversation term
+    vector only folds in messages it has not seen yet, and callers fetch
+    just those from the store (``folded_messages`` → ``since``), so each
+    request costs O(new tokens).  Because the vector is rebuilt incrementally
+    from the conversation history, it stays correct when another worker
+    process served the previous turns.
+  • At most EXPANSION_MAX_CONVERSATIONS term vectors are kept (LRU); an
+    evicted conversation is rebuilt from its history on its next turn.
+  • Older turns fade by EXPANSION_DECAY per turn.  Decay is applied
+    lazily (weights are stored pre-divided by DECAY^turn), so nothing
+    already stored has to be touched when a new turn arrives.
+  • Salience = recency weight × BM25 IDF of the term.
+  • The top EXPANSION_MAX_TERMS terms not already in the question are
+    returned with weights scaled into (0, EXPANSION_WEIGHT].
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import (
+    EXPANSION_MAX_TERMS,
+    EXPANSION_WEIGHT,
+    EXPANSION_DECAY,
+    EXPANSION_ASSISTANT_WEIGHT,
+    EXPANSION_MAX_CONVERSATIONS,
+)
+from rag.ingest import tokenize
+from rag.retrieval import get_term_stats
+
+
+# Rebase stored weights after this many turns so DECAY^-turn stays finite.
+_REBASE_EVERY = 32
+# Terms whose effective weight fell below this are dropped on rebase.
+_PRUNE_BELOW = 1e-3
+
+# conv_id → term state, least recently used first.
+_term_state: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _rebase(state: Dict[str, Any]) -> None:
+    factor = EXPANSION_DECAY ** state["turn"]
+    state["weights"] = {
+        t: w * factor
+        for t, w in state["weights"].items()
+        if w * factor >= _PRUNE_BELOW
+    }
+    state["turn"] = 0
+
+
+def _fold_turn(state: Dict[str, Any], question: str, answer: str) -> None:
+    state["turn"] += 1
+    if state["turn"] >= _REBASE_EVERY:
+        _rebase(state)
+
+    scale = EXPANSION_DECAY ** -state["turn"]
+    weights = state["weights"]
+    for tok in set(tokenize(question)):
+        weights[tok] = weights.get(tok, 0.0) + scale
+    if answer:
+        for tok in set(tokenize(answer)):
+            weights[tok] = weights.get(tok, 0.0) + scale * EXPANSION_ASSISTANT_WEIGHT
+
+
+def _sync(
+    conv_id: str,
+    messages: List[Dict[str, str]],
+    offset: int,
+) -> Optional[Dict[str, Any]]:
+    # *messages* are the conversation's messages from position *offset* on.
+    state = _term_state.get(conv_id)
+    if state is None or not offset <= state["seen"] <= offset + len(messages):
+        if not messages:
+            return None
+        state = {"turn": 0, "weights": {}, "seen": offset}
+        _term_state[conv_id] = state
+        while len(_term_state) > EXPANSION_MAX_CONVERSATIONS:
+            _term_state.popitem(last=False)
+    else:
+        _term_state.move_to_end(conv_id)
+
+    pending = messages[state["seen"] - offset:]
+    for i in range(0, len(pending) - 1, 2):
+        user, assistant = pending[i], pending[i + 1]
+        if user.get("role") == "user" and assistant.get("role") == "assistant":
+            _fold_turn(state, user.get("content", ""), assistant.get("content", ""))
+        state["seen"] += 2
+    return state
+
+
+def folded_messages(conv_id: str) -> int:
+    """Number of leading messages of *conv_id* already folded in (0 if not cached)."""
+    state = _term_state.get(conv_id)
+    return state["seen"] if state else 0
+
+
+def expand_query(
+    conv_id: str,
+    question: str,
+    history: List[Dict[str, str]],
+    max_terms: int = EXPANSION_MAX_TERMS,
+    offset: int = 0,
+) -> Dict[str, float]:
+    """
+    Return ``{term: weight}`` expansion terms for *question* drawn from
+    the conversation's earlier turns (empty for a new conversation).
+    *history* holds the messages of ``conv_id`` from position *offset* on;
+    pass ``offset=folded_messages(conv_id)`` to hand over only new turns.
+    """
+    state = _sync(conv_id, history, offset)
+    if not state or not state["weights"]:
+        return {}
+
+    idf = get_term_stats()["idf"]
+    present = set(tokenize(question))
+    factor = EXPANSION_DECAY ** state["turn"]
+
+    salient: List[tuple] = []
+    for tok, w in state["weights"].items():
+        if tok in present:
+            continue
+        term_idf = idf.get(tok, 0.0)
+        if term_idf <= 0:
+            continue
+        salient.append((w * factor * term_idf, tok))
+
+    if not salient:
+        return {}
+
+    salient.sort(reverse=True)
+    top = salient[:max_terms]
+    best = top[0][0]
+    return {tok: round(EXPANSION_WEIGHT * score / best, 4) for score, tok in top}
+
+
+def forget_conversation(conv_id: str) -> None:
+    _term_state.pop(conv_id, None)
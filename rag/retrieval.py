@@ -3,80 +3,359 @@ ClearPath Chatbot – BM25 Retrieval Layer
 ==========================================
 Loads the pre-built BM25 index from disk and exposes a single
 function to retrieve the top-K most relevant chunks for a query.
+
+The index is a set of shards.  With the default layout the whole
+corpus is a single shard ("all"); after ``python -m rag.ingest --sharded``
+every document group under index_store/shards/ is its own shard.  An
+incomplete set of shard directories is ignored (with a warning) and the
+monolithic index is served instead.
+
+  • Global statistics – document frequencies, document count and average
+    length are summed across shards, so IDF and length normalisation (and
+    therefore scores) are identical to a single monolithic BM25Okapi.
+  • Scatter-gather – each shard scores the query and returns its best
+    candidates; shards are scored in a thread pool (the NumPy work
+    releases the GIL) and the per-shard lists are merged with a heap.
+  • Independent reloads – ``reload_shard(name)`` re-reads one shard and
+    relinks the global statistics; the other shards are reused as-is.
+
+The top TOP_K × MMR_CANDIDATE_FACTOR candidates are re-ranked with MMR
+over the chunks' MinHash signatures, so near-identical chunks (overlap
+windows, the same text repeated across documents) do not crowd out the
+rest of the context.
+
+Each shard is compiled into flat NumPy postings arrays (term → doc ids /
+term frequencies).  Scoring only touches those buffers, so when the
+index is loaded in a parent process before forking (see serve.py) every
+worker reads the same physical pages instead of copying them on first
+access.
 """
 
 from __future__ import annotations
 
+import heapq
 import os
 import sys
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from config import TOP_K_CHUNKS
-from rag.database import load_bm25_index, load_chunks
-from rag.ingest import tokenize                         
+from config import (
+    TOP_K_CHUNKS,
+    MMR_CANDIDATE_FACTOR,
+    BM25_K1,
+    BM25_B,
+    BM25_EPSILON,
+    RETRIEVAL_THREADS,
+)
+from rag.database import (
+    load_bm25_index,
+    load_chunks,
+    load_signatures,
+    list_shards,
+    active_shards,
+    missing_shards,
+    load_shard,
+    combine_shard_versions,
+    index_version,
+)
+from rag.dedup import minhash_batch, mmr_select
+from rag.ingest import encode
 
 
-_bm25 = None
-_chunks: Optional[List[Dict[str, Any]]] = None
+MONOLITHIC_SHARD = "all"
 
+_index: Optional[Dict[str, Any]] = None
+_shards: Dict[str, Dict[str, Any]] = {}
+_reload_lock = threading.Lock()
 
-def _ensure_loaded() -> None:
-    global _bm25, _chunks
-    if _bm25 is not None and _chunks is not None:
-        return
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+
+
+def _compile_shard(
+    name: str,
+    chunks: List[Dict[str, Any]],
+    tokenized_corpus: Sequence[Sequence[str]],
+    signatures: Optional[np.ndarray],
+    version: Optional[str] = None,
+) -> Dict[str, Any]:
+    doc_freqs = [Counter(tokens) for tokens in tokenized_corpus]
+    terms = sorted({t for freqs in doc_freqs for t in freqs})
+    vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+
+    postings: List[List[Tuple[int, int]]] = [[] for _ in terms]
+    for doc_id, freqs in enumerate(doc_freqs):
+        for term, tf in freqs.items():
+            postings[vocab[term]].append((doc_id, tf))
+
+    ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(p) for p in postings])
+    docs = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(ptr[-1]))
+    tfs = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(ptr[-1]))
+
+    if signatures is None or len(signatures) != len(chunks):
+        # Index built before signatures were persisted.
+        signatures = minhash_batch(tokenized_corpus)
 
-    bm25_obj, _ = load_bm25_index()
-    chunks = load_chunks()
+    return {
+        "name": name,
+        "chunks": chunks,
+        "terms": terms,
+        "vocab": vocab,
+        "ptr": ptr,
+        "docs": docs,
+        "tfs": tfs,
+        "df": np.diff(ptr),
+        "doc_len": np.array([len(t) for t in tokenized_corpus], dtype=np.float64),
+        "signatures": signatures if len(signatures) == len(chunks) else None,
+        "version": version,
+    }
 
-    if bm25_obj is None or chunks is None:
+
+def _global_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    # Same formula and negative-IDF flooring as rank_bm25.BM25Okapi.
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    floor = BM25_EPSILON * (idf.sum() / len(idf)) if len(idf) else 0.0
+    return np.where(idf < 0, floor, idf)
+
+
+def _link(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build global statistics and per-shard scoring views."""
+    terms = sorted({t for s in shards for t in s["terms"]})
+    vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+
+    df = np.zeros(len(terms), dtype=np.float64)
+    local_to_global: List[np.ndarray] = []
+    for s in shards:
+        l2g = np.fromiter((vocab[t] for t in s["terms"]), dtype=np.int64, count=len(s["terms"]))
+        np.add.at(df, l2g, s["df"])
+        local_to_global.append(l2g)
+
+    n_docs = sum(len(s["chunks"]) for s in shards)
+    total_len = sum(float(s["doc_len"].sum()) for s in shards)
+    avgdl = total_len / n_docs if n_docs else 1.0
+    idf = _global_idf(df, n_docs)
+
+    views: List[Dict[str, Any]] = []
+    for s, l2g in zip(shards, local_to_global):
+        g2l = np.full(len(terms), -1, dtype=np.int32)
+        g2l[l2g] = np.arange(len(l2g), dtype=np.int32)
+        views.append({
+            "shard": s,
+            "g2l": g2l,
+            "idf": idf[l2g],
+            # Per-doc length normaliser k1·(1 − b + b·|d|/avgdl), precomputed once.
+            "norm": BM25_K1 * (1 - BM25_B + BM25_B * s["doc_len"] / avgdl),
+        })
+
+    return {
+        "vocab": vocab,
+        "idf_map": dict(zip(terms, idf.tolist())),
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "n_docs": n_docs,
+        "views": views,
+        # Sharded: built from the versions of the builds actually loaded.
+        "version": (
+            index_version() if shards[0]["version"] is None
+            else combine_shard_versions({s["name"]: s["version"] for s in shards})
+        ),
+        # raw query word → global term id (-1 = unknown); filled lazily per process.
+        "id_cache": {},
+    }
+
+
+def _load_shard_from_disk(name: str) -> Dict[str, Any]:
+    version = None
+    if name == MONOLITHIC_SHARD:
+        _, tokenized_corpus = load_bm25_index()
+        chunks = load_chunks()
+        signatures = load_signatures()
+    else:
+        chunks, tokenized_corpus, signatures, version = load_shard(name)
+
+    if chunks is None or tokenized_corpus is None:
         raise RuntimeError(
             "BM25 index not found.  Run `python -m rag.ingest` first."
         )
+    return _compile_shard(name, chunks, tokenized_corpus, signatures, version)
 
-    _bm25 = bm25_obj
-    _chunks = chunks
+
+def _ensure_loaded() -> None:
+    global _index
+    if _index is not None:
+        return
+
+    with _reload_lock:
+        if _index is not None:
+            return
+        names = active_shards()
+        if not names:
+            missing = missing_shards()
+            if list_shards() and missing:
+                print(f"⚠️ Sharded index incomplete (missing: {', '.join(missing)}); "
+                      f"serving the monolithic index")
+            names = [MONOLITHIC_SHARD]
+        _shards.clear()
+        for name in names:
+            _shards[name] = _load_shard_from_disk(name)
+        _index = _link([_shards[n] for n in names])
+
+
+def _executor() -> ThreadPoolExecutor:
+    # Created lazily and per process: a pool inherited across fork() has
+    # no live threads.
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="bm25-shard")
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _score_view(
+    view: Dict[str, Any],
+    view_idx: int,
+    weighted_ids: List[Tuple[int, float]],
+    k1: float,
+    limit: int,
+) -> List[Tuple[float, int, int]]:
+    shard = view["shard"]
+    scores = np.zeros(len(shard["chunks"]), dtype=np.float64)
+    for gid, weight in weighted_ids:
+        lid = view["g2l"][gid]
+        if lid < 0:
+            continue
+        lo, hi = shard["ptr"][lid], shard["ptr"][lid + 1]
+        docs = shard["docs"][lo:hi]
+        tf = shard["tfs"][lo:hi]
+        scores[docs] += weight * view["idf"][lid] * tf * (k1 + 1) / (tf + view["norm"][docs])
+
+    hits = np.flatnonzero(scores > 0)
+    if len(hits) > limit:
+        hits = hits[np.argpartition(scores[hits], -limit)[-limit:]]
+    return [(float(scores[d]), view_idx, int(d)) for d in hits]
+
+
+def _gather(
+    index: Dict[str, Any],
+    weighted_ids: List[Tuple[int, float]],
+    limit: int,
+) -> List[Tuple[float, int, int]]:
+    views = index["views"]
+    if len(views) == 1:
+        partials = [_score_view(views[0], 0, weighted_ids, index["k1"], limit)]
+    else:
+        futures = [
+            _executor().submit(_score_view, v, i, weighted_ids, index["k1"], limit)
+            for i, v in enumerate(views)
+        ]
+        partials = [f.result() for f in futures]
+    # Ties broken by (shard, doc) order, matching a single index's ranking.
+    return heapq.nsmallest(
+        limit,
+        (hit for part in partials for hit in part),
+        key=lambda h: (-h[0], h[1], h[2]),
+    )
 
 
 def retrieve(
     query: str,
     top_k: int = TOP_K_CHUNKS,
+    expansion: Optional[Dict[str, float]] = None,
+    diversify: bool = True,
 ) -> List[Dict[str, Any]]:
-    
+
     _ensure_loaded()
-    assert _bm25 is not None and _chunks is not None
+    index = _index
+    assert index is not None
 
-    query_tokens = tokenize(query)
-    if not query_tokens:
+    weighted_ids: List[Tuple[int, float]] = [
+        (gid, 1.0) for gid in encode(query, index["vocab"], index["id_cache"])
+    ]
+    if not weighted_ids and not expansion:
         return []
+    for term, weight in (expansion or {}).items():
+        gid = index["vocab"].get(term)
+        if gid is not None:
+            weighted_ids.append((gid, weight))
 
-    scores = _bm25.get_scores(query_tokens)
+    views = index["views"]
+    can_diversify = diversify and all(v["shard"]["signatures"] is not None for v in views)
+    limit = top_k * MMR_CANDIDATE_FACTOR if can_diversify else top_k
 
-    max_score = float(np.max(scores)) if np.max(scores) > 0 else 1.0
-    normalised = scores / max_score
+    hits = _gather(index, weighted_ids, limit)
+    if not hits:
+        return []
+    max_score = hits[0][0] if hits[0][0] > 0 else 1.0
+    relevance = np.array([score / max_score for score, _, _ in hits])
 
-    top_indices = np.argsort(scores)[::-1][:top_k]
+    if can_diversify:
+        signatures = np.vstack([views[v]["shard"]["signatures"][d] for _, v, d in hits])
+        order = mmr_select(range(len(hits)), relevance, signatures, top_k)
+    else:
+        order = list(range(min(top_k, len(hits))))
 
     results: List[Dict[str, Any]] = []
-    for idx in top_indices:
-        idx = int(idx)
-        score = float(normalised[idx])
-        if score <= 0:
-            continue                        
-        chunk = dict(_chunks[idx])         
-        chunk["relevance_score"] = round(score, 4)
+    for pos in order:
+        _, v, d = hits[pos]
+        chunk = dict(views[v]["shard"]["chunks"][d])
+        chunk["relevance_score"] = round(float(relevance[pos]), 4)
         results.append(chunk)
 
     return results
 
 
+def get_term_stats() -> Dict[str, Any]:
+    _ensure_loaded()
+    assert _index is not None
+    return {
+        "idf": _index["idf_map"],
+        "k1": _index["k1"],
+        "b": _index["b"],
+    }
+
+
+def index_info() -> Dict[str, Any]:
+    _ensure_loaded()
+    index = _index
+    assert index is not None
+    return {
+        "version": index["version"],
+        "chunks": index["n_docs"],
+        "terms": len(index["vocab"]),
+        "postings": sum(int(v["shard"]["ptr"][-1]) for v in index["views"]),
+        "shards": {
+            v["shard"]["name"]: len(v["shard"]["chunks"]) for v in index["views"]
+        },
+    }
+
+
+def reload_shard(name: str) -> None:
+    """
+    Re-read one loaded shard from disk and relink global statistics.
+    Only valid for the sharded layout; new shards need a full reload.
+    """
+    global _index
+    _ensure_loaded()
+    with _reload_lock:
+        if MONOLITHIC_SHARD in _shards:
+            raise ValueError("The loaded index is not sharded")
+        if name not in _shards:
+            raise ValueError(f"Unknown shard '{name}'")
+        _shards[name] = _load_shard_from_disk(name)
+        _index = _link([_shards[n] for n in sorted(_shards)])
+
+
 def reload_index() -> None:
-    global _bm25, _chunks
-    _bm25 = None
-    _chunks = None
+    global _index
+    with _reload_lock:
+        _index = None
     _ensure_loaded()
 
 
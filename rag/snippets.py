@@ -0,0 +1,194 @@
+"""
+ClearPath Chatbot – Query-Time Snippet Extraction
+===================================================
+Sits between retrieval and generation.  Each retrieved chunk is ~350
+words, but usually only a few sentences actually answer the query.
+
+For every chunk:
+  1. Split the text into sentences (over-long "sentences" produced by
+     PDF tables are cut into SNIPPET_MAX_SENTENCE_WORDS windows).
+  2. Score each sentence against the query with BM25 term weighting,
+     re-using the IDF / k1 / b statistics of the loaded index.
+  3. Greedily keep the best sentences plus SNIPPET_NEIGHBOR_SENTENCES
+     of surrounding context until SNIPPET_WORDS_PER_CHUNK is reached.
+  4. Emit the kept sentences in document order, joining gaps with "…".
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import (
+    SNIPPET_WORDS_PER_CHUNK,
+    SNIPPET_MAX_SENTENCE_WORDS,
+    SNIPPET_NEIGHBOR_SENTENCES,
+    EXTRACTIVE_ANSWER_CHUNKS,
+)
+from rag.ingest import tokenize
+from rag.retrieval import get_term_stats
+
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\s+(?=•)")
+
+
+def _split_sentences(text: str, max_words: int) -> List[str]:
+    sentences: List[str] = []
+    for raw in _SENTENCE_SPLIT.split(text):
+        words = raw.split()
+        for i in range(0, len(words), max_words):
+            sentences.append(" ".join(words[i:i + max_words]))
+    return sentences
+
+
+def _score_sentences(
+    sentences: List[List[str]],
+    query_terms: List[str],
+    stats: Dict[str, Any],
+) -> List[float]:
+    idf = stats["idf"]
+    k1 = stats["k1"]
+    b = stats["b"]
+    lengths = [len(s) for s in sentences]
+    avg_len = (sum(lengths) / len(lengths)) or 1.0
+
+    scores: List[float] = []
+    for tokens, length in zip(sentences, lengths):
+        score = 0.0
+        if tokens:
+            norm = k1 * (1 - b + b * length / avg_len)
+            for term in query_terms:
+                tf = tokens.count(term)
+                if tf:
+                    score += idf.get(term, 0.0) * tf * (k1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def _select(
+    sentences: List[str],
+    scores: List[float],
+    budget: int,
+    neighbours: int,
+) -> List[int]:
+    word_counts = [len(s.split()) for s in sentences]
+    ranked = sorted(
+        (i for i, sc in enumerate(scores) if sc > 0),
+        key=lambda i: scores[i],
+        reverse=True,
+    )
+    if not ranked:
+        ranked = list(range(len(sentences)))
+        neighbours = 0
+
+    kept: set = set()
+    used = 0
+    for best in ranked:
+        window = range(
+            max(0, best - neighbours),
+            min(len(sentences), best + neighbours + 1),
+        )
+        # Centre sentence first so a tight budget still keeps the match.
+        for idx in sorted(window, key=lambda i: abs(i - best)):
+            if idx in kept:
+                continue
+            if used + word_counts[idx] > budget and kept:
+                break
+            kept.add(idx)
+            used += word_counts[idx]
+        if used >= budget:
+            break
+    return sorted(kept)
+
+
+def extract_snippet(
+    text: str,
+    query_terms: List[str],
+    stats: Dict[str, Any],
+    budget: int = SNIPPET_WORDS_PER_CHUNK,
+    neighbours: int = SNIPPET_NEIGHBOR_SENTENCES,
+    max_sentence_words: int = SNIPPET_MAX_SENTENCE_WORDS,
+) -> str:
+    if len(text.split()) <= budget:
+        return text
+
+    sentences = _split_sentences(text, max_sentence_words)
+    scores = _score_sentences(
+        [tokenize(s) for s in sentences], query_terms, stats
+    )
+    kept = _select(sentences, scores, budget, neighbours)
+
+    parts: List[str] = []
+    prev = -1
+    for idx in kept:
+        if parts and idx != prev + 1:
+            parts.append("…")
+        parts.append(sentences[idx])
+        prev = idx
+    return " ".join(parts)
+
+
+def compress_chunks(
+    query: str,
+    chunks: List[Dict[str, Any]],
+    budget: int = SNIPPET_WORDS_PER_CHUNK,
+    extra_terms: Optional[Iterable[str]] = None,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Replace each chunk's ``text`` with a query-focused snippet.
+
+    Returns the new chunk list and the compression ratio
+    (snippet words / original words, 1.0 when nothing was cut).
+    """
+    if not chunks:
+        return [], 1.0
+
+    query_terms = list(dict.fromkeys([*tokenize(query), *(extra_terms or ())]))
+    stats = get_term_stats()
+
+    original_words = 0
+    kept_words = 0
+    compressed: List[Dict[str, Any]] = []
+    for c in chunks:
+        snippet = extract_snippet(c["text"], query_terms, stats, budget=budget)
+        original_words += len(c["text"].split())
+        kept_words += len(snippet.split())
+        compressed.append({**c, "text": snippet})
+
+    ratio = kept_words / original_words if original_words else 1.0
+    return compressed, round(ratio, 4)
+
+
+def build_extractive_answer(
+    snippets: List[Dict[str, Any]],
+    max_chunks: int = EXTRACTIVE_ANSWER_CHUNKS,
+) -> str:
+    """Answer built directly from the top snippets, used when the LLM is skipped."""
+    if not snippets:
+        return (
+            "I don't have enough information in the ClearPath documentation "
+            "to answer that right now."
+        )
+    lines = [
+        "A full answer could not be generated in time. "
+        "These are the most relevant passages from the ClearPath documentation:"
+    ]
+    for i, c in enumerate(snippets[:max_chunks], 1):
+        lines.append(f"[{i}] {c['source']} (page {c['page']}): {c['text']}")
+    return "\n\n".join(lines)
+
+
+if __name__ == "__main__":
+    from rag.retrieval import retrieve
+
+    query = "What is the price of the Pro plan?"
+    chunks = retrieve(query)
+    snippets, ratio = compress_chunks(query, chunks)
+    print(f"Query: {query}   compression={ratio:.2%}\n")
+    for i, s in enumerate(snippets, 1):
+        print(f"  [{i}] {s['source']} p{s['page']}")
+        print(f"      {s['text']}\n")
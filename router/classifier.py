@@ -15,6 +15,22 @@ Rules (heuristic mix):
 Routing:
   • "simple"  → llama-3.1-8b-instant
   • "complex" → llama-3.3-70b-versatile
+
+Routing table:
+  Each rule above contributes a weight; a query is "complex" when the
+  summed weight reaches ``complex_threshold``.  The defaults reproduce the
+  "ANY rule fires" behaviour.  ``python -m router.fit_routing`` fits a new
+  table from the request logs and writes ROUTING_TABLE_FILE, which is
+  loaded once at import time.
+
+SLO overflow (online mode):
+  When ROUTER_P95_SLO_MS > 0 and the large model's observed p95 latency
+  over the last ROUTER_LATENCY_WINDOW calls exceeds it, complex queries
+  are sent to the small model until latency recovers.  One in every
+  ROUTER_SLO_PROBE_EVERY overflowed queries still goes to the large
+  model (``routed_by="slo_probe"``) so its latency window keeps getting
+  fresh samples, and samples older than ROUTER_LATENCY_MAX_AGE_S expire,
+  so overflow ends once the large model is back under the SLO.
 """
 
 from __future__ import annotations
@@ -24,10 +40,27 @@ import os
 import re
 import sys
 import time
-from typing import Dict, Any
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from config import MODEL_SIMPLE, MODEL_COMPLEX, ROUTER_LOG_FILE, LOG_DIR
+from config import (
+    MODEL_SIMPLE,
+    MODEL_COMPLEX,
+    ROUTER_LOG_FILE,
+    LOG_DIR,
+    ROUTING_TABLE_FILE,
+    ROUTER_P95_SLO_MS,
+    ROUTER_LATENCY_WINDOW,
+    ROUTER_LATENCY_MIN_SAMPLES,
+    ROUTER_LATENCY_MAX_AGE_S,
+    ROUTER_SLO_PROBE_EVERY,
+)
 
 
 
@@ -50,33 +83,119 @@ _SUBORDINATE_MARKERS = re.compile(
 
 
 
+DEFAULT_ROUTING_TABLE: Dict[str, Any] = {
+    "word_count_threshold": 12,
+    "weights": {
+        "long": 1.0,
+        "keywords": 1.0,
+        "multi_question": 1.0,
+        "subordinate": 1.0,
+    },
+    "complex_threshold": 1.0,
+}
+
+
+def load_routing_table(path: str = ROUTING_TABLE_FILE) -> Dict[str, Any]:
+    if not os.path.isfile(path):
+        return DEFAULT_ROUTING_TABLE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return DEFAULT_ROUTING_TABLE
+    return {
+        "word_count_threshold": int(
+            table.get("word_count_threshold",
+                      DEFAULT_ROUTING_TABLE["word_count_threshold"])
+        ),
+        "weights": {**DEFAULT_ROUTING_TABLE["weights"], **table.get("weights", {})},
+        "complex_threshold": float(
+            table.get("complex_threshold",
+                      DEFAULT_ROUTING_TABLE["complex_threshold"])
+        ),
+    }
+
+
+_routing_table = load_routing_table()
+
+
+def query_features(query: str) -> Dict[str, Any]:
+    return {
+        "word_count": len(query.split()),
+        "keywords": bool(_COMPLEX_KEYWORDS.search(query)),
+        "multi_question": query.count("?") >= 2,
+        "subordinate": bool(_SUBORDINATE_MARKERS.search(query)),
+    }
+
+
+def classify_features(features: Dict[str, Any], table: Dict[str, Any]) -> str:
+    weights = table["weights"]
+    score = 0.0
+    if features["word_count"] >= table["word_count_threshold"]:
+        score += weights["long"]
+    if features["keywords"]:
+        score += weights["keywords"]
+    if features["multi_question"]:
+        score += weights["multi_question"]
+    if features["subordinate"]:
+        score += weights["subordinate"]
+    return "complex" if score >= table["complex_threshold"] else "simple"
+
+
 def classify_query(query: str) -> str:
+    return classify_features(query_features(query), _routing_table)
+
 
-    words = query.split()
-    word_count = len(words)
 
-    if word_count >= 12:
-        return "complex"
+# (monotonic timestamp, latency_ms) per model.
+_latencies: Dict[str, Deque[Tuple[float, int]]] = {
+    MODEL_SIMPLE: deque(maxlen=ROUTER_LATENCY_WINDOW),
+    MODEL_COMPLEX: deque(maxlen=ROUTER_LATENCY_WINDOW),
+}
 
 
-    if _COMPLEX_KEYWORDS.search(query):
-        return "complex"
+def record_latency(model: str, latency_ms: int) -> None:
+    window = _latencies.get(model)
+    if window is not None:
+        window.append((time.monotonic(), latency_ms))
 
-    if query.count("?") >= 2:
-        return "complex"
 
+def observed_p95(model: str) -> Optional[int]:
+    window = _latencies.get(model)
+    if window is None:
+        return None
+    cutoff = time.monotonic() - ROUTER_LATENCY_MAX_AGE_S
+    while window and window[0][0] < cutoff:
+        window.popleft()
+    if len(window) < ROUTER_LATENCY_MIN_SAMPLES:
+        return None
+    ordered = sorted(ms for _, ms in window)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
 
-    if _SUBORDINATE_MARKERS.search(query):
-        return "complex"
 
-    return "simple"
+_overflowed = 0
 
 
 def route_query(query: str) -> Dict[str, str]:
- 
+    global _overflowed
+
     classification = classify_query(query)
     model = MODEL_SIMPLE if classification == "simple" else MODEL_COMPLEX
-    return {"classification": classification, "model": model}
+    routed_by = "table"
+
+    if model == MODEL_COMPLEX and ROUTER_P95_SLO_MS > 0:
+        p95 = observed_p95(MODEL_COMPLEX)
+        if p95 is not None and p95 > ROUTER_P95_SLO_MS:
+            _overflowed += 1
+            if _overflowed % ROUTER_SLO_PROBE_EVERY == 0:
+                routed_by = "slo_probe"
+            else:
+                model = MODEL_SIMPLE
+                routed_by = "slo_overflow"
+        else:
+            _overflowed = 0
+
+    return {"classification": classification, "model": model, "routed_by": routed_by}
 
 
 
@@ -87,6 +206,8 @@ def log_request(
     tokens_input: int,
     tokens_output: int,
     latency_ms: int,
+    evaluator_flags: Optional[List[str]] = None,
+    routed_by: str = "table",
 ) -> None:
     
     try:
@@ -98,9 +219,17 @@ def log_request(
             "tokens_input": tokens_input,
             "tokens_output": tokens_output,
             "latency_ms": latency_ms,
+            "evaluator_flags": evaluator_flags or [],
+            "routed_by": routed_by,
+            "ts": int(time.time()),
         }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
         with open(ROUTER_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            # Serialise appends across worker processes sharing the file.
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(line)
+            f.flush()
     except OSError:
         pass
 
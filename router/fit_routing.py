@@ -0,0 +1,290 @@
+"""
+ClearPath Chatbot – Offline Routing Table Fitter
+==================================================
+Mines the router log (and optionally extra query files such as
+requests.jsonl) to fit the word-count threshold and rule weights used by
+``router.classifier``.
+
+Method:
+  1. Per model, estimate mean latency, mean token cost and evaluator-flag
+     rate from ``router_logs.jsonl``.
+  2. For every logged / extra query, compute the classifier features once.
+  3. Grid-search thresholds × rule weights.  A candidate table is scored on
+     expected latency and cost relative to the current table; candidates
+     whose expected flag rate exceeds the current one by more than
+     ``--tolerance`` are rejected.
+  4. Write the best table to ROUTING_TABLE_FILE (loaded by the router at
+     startup).
+
+Flag rates use the query's own observed flags when it was served by the
+model the candidate assigns, and the model-wide rate otherwise.  Only
+rows that record ``evaluator_flags`` count towards flag rates, and the
+fit refuses to run until each model has _MIN_FLAG_SAMPLES such rows (logs
+written before flags were recorded cannot bound quality).  Rows served
+in a degraded mode (``degraded_*`` flags) are ignored entirely: their
+latency and tokens do not describe a normal call to the logged model.
+
+Usage:
+    python -m router.fit_routing
+    python -m router.fit_routing --queries requests.jsonl --tolerance 0.01
+    python -m router.fit_routing --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import MODEL_SIMPLE, MODEL_COMPLEX, ROUTER_LOG_FILE, ROUTING_TABLE_FILE
+from router.classifier import (
+    classify_features,
+    load_routing_table,
+    query_features,
+)
+
+
+# USD per million tokens (input, output), Groq on-demand list prices.
+_PRICE_PER_MTOK: Dict[str, Tuple[float, float]] = {
+    MODEL_SIMPLE: (0.05, 0.08),
+    MODEL_COMPLEX: (0.59, 0.79),
+}
+
+_THRESHOLDS = range(6, 25)
+_WEIGHT_GRID = (0.0, 0.5, 1.0)
+_RULES = ("long", "keywords", "multi_question", "subordinate")
+
+_MIN_SAMPLES_PER_MODEL = 5
+_MIN_FLAG_SAMPLES = 5
+
+
+def _read_jsonl(path: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    if not os.path.isfile(path):
+        return rows
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue
+    return rows
+
+
+def _query_text(row: Dict[str, Any]) -> Optional[str]:
+    for key in ("query", "question"):
+        value = row.get(key)
+        if isinstance(value, str) and value.strip():
+            return value
+    return None
+
+
+def is_degraded(row: Dict[str, Any]) -> bool:
+    return any(str(f).startswith("degraded_") for f in row.get("evaluator_flags") or [])
+
+
+def model_stats(log_rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    totals: Dict[str, Dict[str, float]] = {}
+    for row in log_rows:
+        model = row.get("model_used")
+        if model not in _PRICE_PER_MTOK or is_degraded(row):
+            continue
+        t = totals.setdefault(model, {
+            "n": 0, "latency": 0.0, "cost": 0.0, "flagged": 0, "n_flag_known": 0,
+        })
+        price_in, price_out = _PRICE_PER_MTOK[model]
+        t["n"] += 1
+        t["latency"] += row.get("latency_ms", 0)
+        t["cost"] += (
+            row.get("tokens_input", 0) * price_in
+            + row.get("tokens_output", 0) * price_out
+        ) / 1_000_000
+        if "evaluator_flags" in row:
+            t["n_flag_known"] += 1
+            t["flagged"] += 1 if row["evaluator_flags"] else 0
+
+    stats: Dict[str, Dict[str, float]] = {}
+    for model, t in totals.items():
+        stats[model] = {
+            "samples": t["n"],
+            "mean_latency_ms": t["latency"] / t["n"],
+            "mean_cost_usd": t["cost"] / t["n"],
+            "flag_samples": t["n_flag_known"],
+            "flag_rate": (t["flagged"] / t["n_flag_known"]) if t["n_flag_known"] else 0.0,
+        }
+    return stats
+
+
+def _evaluate_table(
+    table: Dict[str, Any],
+    samples: List[Dict[str, Any]],
+    stats: Dict[str, Dict[str, float]],
+) -> Dict[str, float]:
+    latency = cost = flags = 0.0
+    n_complex = 0
+    for s in samples:
+        cls = classify_features(s["features"], table)
+        model = MODEL_SIMPLE if cls == "simple" else MODEL_COMPLEX
+        n_complex += cls == "complex"
+        m = stats[model]
+        latency += m["mean_latency_ms"]
+        cost += m["mean_cost_usd"]
+        observed = s["observed_flags"].get(model)
+        flags += observed if observed is not None else m["flag_rate"]
+    n = len(samples)
+    return {
+        "mean_latency_ms": latency / n,
+        "mean_cost_usd": cost / n,
+        "flag_rate": flags / n,
+        "complex_share": n_complex / n,
+    }
+
+
+def _candidate_tables() -> Iterable[Dict[str, Any]]:
+    for threshold in _THRESHOLDS:
+        for combo in itertools.product(_WEIGHT_GRID, repeat=len(_RULES)):
+            yield {
+                "word_count_threshold": threshold,
+                "weights": dict(zip(_RULES, combo)),
+                "complex_threshold": 1.0,
+            }
+
+
+def _distance(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    d = abs(a["word_count_threshold"] - b["word_count_threshold"]) / 10
+    for rule in _RULES:
+        d += abs(a["weights"][rule] - b["weights"][rule])
+    return d
+
+
+def fit(
+    log_rows: List[Dict[str, Any]],
+    extra_queries: List[str],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.0,
+    cost_weight: float = 1.0,
+) -> Dict[str, Any]:
+    stats = model_stats(log_rows)
+    for model in (MODEL_SIMPLE, MODEL_COMPLEX):
+        if stats.get(model, {}).get("samples", 0) < _MIN_SAMPLES_PER_MODEL:
+            raise ValueError(
+                f"Need at least {_MIN_SAMPLES_PER_MODEL} logged requests for "
+                f"{model} to fit a routing table."
+            )
+        if stats[model]["flag_samples"] < _MIN_FLAG_SAMPLES:
+            raise ValueError(
+                f"Need at least {_MIN_FLAG_SAMPLES} logged requests with evaluator_flags "
+                f"for {model}; older log rows cannot bound the flag rate."
+            )
+
+    by_query: Dict[str, Dict[str, Any]] = {}
+    for row in log_rows:
+        q = _query_text(row)
+        if q is None or is_degraded(row):
+            continue
+        sample = by_query.setdefault(q, {"features": query_features(q), "flag_obs": {}})
+        if "evaluator_flags" in row and row.get("model_used") in stats:
+            sample["flag_obs"].setdefault(row["model_used"], []).append(
+                1.0 if row["evaluator_flags"] else 0.0
+            )
+    for q in extra_queries:
+        by_query.setdefault(q, {"features": query_features(q), "flag_obs": {}})
+
+    samples = [
+        {
+            "features": s["features"],
+            "observed_flags": {m: sum(v) / len(v) for m, v in s["flag_obs"].items()},
+        }
+        for s in by_query.values()
+    ]
+
+    base = _evaluate_table(baseline, samples, stats)
+    if base["mean_latency_ms"] <= 0 and base["mean_cost_usd"] <= 0:
+        raise ValueError(
+            "Logged latency and token counts are all zero; nothing to optimise."
+        )
+
+    def objective(r: Dict[str, float]) -> float:
+        # A term whose baseline is zero (e.g. no token usage logged) is skipped.
+        score = 0.0
+        if base["mean_latency_ms"] > 0:
+            score += r["mean_latency_ms"] / base["mean_latency_ms"]
+        if base["mean_cost_usd"] > 0:
+            score += cost_weight * r["mean_cost_usd"] / base["mean_cost_usd"]
+        return score
+
+    best_table, best_result = baseline, base
+    best_key = (objective(base), 0.0)
+    for table in _candidate_tables():
+        result = _evaluate_table(table, samples, stats)
+        if result["flag_rate"] > base["flag_rate"] + tolerance:
+            continue
+        key = (round(objective(result), 6), _distance(table, baseline))
+        if key < best_key:
+            best_table, best_result, best_key = table, result, key
+
+    return {
+        **best_table,
+        "fitted_on": {
+            "queries": len(samples),
+            "model_stats": stats,
+            "baseline": base,
+            "expected": best_result,
+            "tolerance": tolerance,
+            "cost_weight": cost_weight,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fit the router's routing table from logs.")
+    parser.add_argument("--log", default=ROUTER_LOG_FILE)
+    parser.add_argument("--queries", nargs="*", default=[],
+                        help="Extra JSONL files with 'query' or 'question' fields.")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Allowed increase in expected evaluator flag rate.")
+    parser.add_argument("--cost-weight", type=float, default=1.0)
+    parser.add_argument("--out", default=ROUTING_TABLE_FILE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    log_rows = _read_jsonl(args.log)
+    extra: List[str] = []
+    for path in args.queries:
+        extra.extend(q for q in map(_query_text, _read_jsonl(path)) if q)
+
+    try:
+        table = fit(
+            log_rows, extra, load_routing_table(args.out),
+            tolerance=args.tolerance, cost_weight=args.cost_weight,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    info = table["fitted_on"]
+    print(f"  Queries considered : {info['queries']}")
+    for label in ("baseline", "expected"):
+        r = info[label]
+        print(f"  {label:9s}: latency={r['mean_latency_ms']:.0f}ms  "
+              f"cost=${r['mean_cost_usd'] * 1000:.4f}/1k  "
+              f"flags={r['flag_rate']:.3f}  complex={r['complex_share']:.0%}")
+    print(f"  Threshold          : {table['word_count_threshold']} words")
+    print(f"  Weights            : {table['weights']}")
+
+    if args.dry_run:
+        return
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=2)
+    print(f"  💾 Saved routing table → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+ClearPath Chatbot – Multi-Worker Launcher
+===========================================
+``uvicorn main:app --workers N`` spawns fresh interpreters, so every
+worker unpickles and compiles its own copy of the BM25 index and keeps
+its own conversation memory.
+
+This launcher pre-forks instead (POSIX only):
+  1. The parent imports the app, loads and compiles the index once, then
+     freezes the GC so the loaded objects are never written to again.
+  2. The parent binds the listening socket and forks N workers that all
+     accept on it.  Workers share the index pages copy-on-write, so
+     memory grows sub-linearly with N and every worker serves the same
+     index version (reported by GET /health).
+  3. Conversations default to the SQLite backend so any worker can serve
+     any turn; the router log is appended under an exclusive file lock.
+
+Index rebuilds take effect on restart (re-run this script); the
+per-process shard reload endpoint is disabled under this launcher.
+
+Start with:
+    python serve.py --workers 4 --port 8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before ``config`` is imported anywhere.
+os.environ.setdefault("CONVERSATION_BACKEND", "sqlite")
+
+import uvicorn
+
+import main as app_module
+from main import app
+from rag.retrieval import index_info
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, log_level)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); use `uvicorn main:app` on this platform.")
+
+    app_module.PREFORK_WORKERS = args.workers
+    info = index_info()
+    print(f"⚡ Index {info['version']} loaded in parent: "
+          f"{info['chunks']} chunks, {info['terms']} terms, {info['postings']} postings")
+
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    workers: Dict[int, int] = {}
+    for slot in range(args.workers):
+        workers[_spawn(sock, args.log_level)] = slot
+    print(f"🚀 {len(workers)} workers serving on http://{args.host}:{args.port}")
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = workers.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"⚠️ Worker {pid} exited (status {status}); restarting slot {slot}")
+        time.sleep(0.5)
+        workers[_spawn(sock, args.log_level)] = slot
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+ClearPath Chatbot – Conversation Store
+========================================
+Keeps the message history for each ``conversation_id``.
+
+Backends (selected by CONVERSATION_BACKEND):
+  • "memory" – a per-process Python dict (default; lost on restart and
+               not shared between workers, so ``uvicorn --workers N``
+               needs CONVERSATION_BACKEND=sqlite as well).
+  • "sqlite" – a WAL-mode SQLite file at CONVERSATION_DB_FILE, so every
+               worker of a multi-process deployment sees the same history.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import CONVERSATION_BACKEND, CONVERSATION_DB_FILE
+
+
+_memory: Dict[str, List[Dict[str, str]]] = {}
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    # One connection per thread *and* per process: a connection opened
+    # before fork must never be reused by the child.
+    conn: Optional[sqlite3.Connection] = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(CONVERSATION_DB_FILE), exist_ok=True)
+    conn = sqlite3.connect(CONVERSATION_DB_FILE, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS messages ("
+        "  conv_id TEXT NOT NULL,"
+        "  seq INTEGER NOT NULL,"
+        "  role TEXT NOT NULL,"
+        "  content TEXT NOT NULL,"
+        "  PRIMARY KEY (conv_id, seq))"
+    )
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def get_history(
+    conv_id: str,
+    since: int = 0,
+    limit: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Messages of *conv_id* from position *since* on; with *limit*, only the
+    last *limit* of those.  Lets callers fetch just the new or recent turns
+    instead of the whole conversation.
+    """
+    if CONVERSATION_BACKEND != "sqlite":
+        messages = _memory.get(conv_id, [])[since:]
+        return list(messages[-limit:] if limit else messages)
+
+    if limit:
+        rows = _connect().execute(
+            "SELECT role, content FROM messages WHERE conv_id = ? AND seq >= ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (conv_id, since, limit),
+        ).fetchall()
+        rows.reverse()
+    else:
+        rows = _connect().execute(
+            "SELECT role, content FROM messages WHERE conv_id = ? AND seq >= ? ORDER BY seq",
+            (conv_id, since),
+        ).fetchall()
+    return [{"role": role, "content": content} for role, content in rows]
+
+
+def append_exchange(conv_id: str, question: str, answer: str) -> None:
+    if CONVERSATION_BACKEND != "sqlite":
+        history = _memory.setdefault(conv_id, [])
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+        return
+
+    conn = _connect()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        (next_seq,) = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conv_id = ?",
+            (conv_id,),
+        ).fetchone()
+        conn.executemany(
+            "INSERT INTO messages (conv_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [
+                (conv_id, next_seq, "user", question),
+                (conv_id, next_seq + 1, "assistant", answer),
+            ],
+        )
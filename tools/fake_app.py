@@ -0,0 +1,33 @@
+"""
+ClearPath Chatbot – App With Simulated LLM
+============================================
+The real FastAPI app with ``generate_answer`` swapped for the
+deterministic fake in ``models.fake_groq``.  Lets tools/replay.py drive a
+real server over HTTP without calling Groq:
+
+    REPLAY_SEED=0 REPLAY_LATENCY_SCALE=1.0 uvicorn tools.fake_app:app --port 8000
+
+Requests are logged to REPLAY_LOG_FILE (env-overridable) instead of the
+router log, so simulated rows never feed router.fit_routing or the fake's
+own latency samples.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main
+import router.classifier
+from config import REPLAY_LOG_FILE
+from models.fake_groq import make_generate_answer
+
+router.classifier.ROUTER_LOG_FILE = REPLAY_LOG_FILE
+main.generate_answer = make_generate_answer(
+    seed=int(os.getenv("REPLAY_SEED", "0")),
+    latency_scale=float(os.getenv("REPLAY_LATENCY_SCALE", "1.0")),
+)
+
+app = main.app
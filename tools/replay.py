@@ -0,0 +1,292 @@
+"""
+ClearPath Chatbot – Offline Replay Load Generator
+===================================================
+Replays logged traffic against the /query endpoint for capacity planning.
+
+Workload:
+  Queries are read from the router log (``query`` field) plus any extra
+  JSONL files passed with ``--queries`` (``query`` or ``question`` field),
+  in order, repeated until ``--requests`` is reached.
+
+Targets:
+  • in-process (default) – drives ``main.app`` through an ASGI transport
+    with ``generate_answer`` replaced by the deterministic fake in
+    ``models.fake_groq`` (latency / tokens sampled from the log).
+  • ``--url`` – drives a running server over HTTP, e.g. one started with
+    ``uvicorn tools.fake_app:app`` or ``python serve.py``.
+
+Load shapes:
+  • ``--rate 2,5,10``        open loop: Poisson arrivals at each rate (req/s);
+                             latency is measured from the scheduled send
+                             time, so queueing delay is included.
+  • ``--concurrency 1,4,16`` closed loop: N in-flight requests at a time.
+
+Report (per sweep point): throughput, error rate, total latency
+percentiles and per-stage percentiles from the ``Server-Timing`` header.
+
+With ``--cold`` (in-process only) the index is reloaded and the tokenizer
+and term-id caches are cleared before each sweep point, and the report
+adds a cold/warm split: cold = first time a query text is seen since the
+reset, warm = repeats.  Without it caches carry over between points and
+no split is reported.
+
+Usage:
+    python -m tools.replay --requests 200 --concurrency 1,4,16
+    python -m tools.replay --rate 2,5 --url http://localhost:8000 --json out.json
+    python -m tools.replay --requests 200 --concurrency 4 --cold
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import ROUTER_LOG_FILE, REPLAY_LOG_FILE
+
+
+_PERCENTILES = (50, 90, 95, 99)
+
+
+def load_workload(log_file: str, extra_files: List[str]) -> List[str]:
+    queries: List[str] = []
+    for path in [log_file, *extra_files]:
+        if not os.path.isfile(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                q = row.get("query") or row.get("question")
+                if isinstance(q, str) and q.strip():
+                    queries.append(q)
+    return queries
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    question: str,
+    scheduled: float,
+    cold: bool,
+    timeout: float,
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"cold": cold, "ok": False, "stages": {}}
+    try:
+        resp = await client.post("/query", json={"question": question}, timeout=timeout)
+        result["status"] = resp.status_code
+        result["ok"] = resp.status_code == 200
+        result["stages"] = _parse_server_timing(resp.headers.get("server-timing", ""))
+    except httpx.HTTPError as e:
+        result["status"] = type(e).__name__
+    result["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+    return result
+
+
+def _mark_cold(queries: List[str]) -> List[bool]:
+    seen: set = set()
+    flags: List[bool] = []
+    for q in queries:
+        flags.append(q not in seen)
+        seen.add(q)
+    return flags
+
+
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    queries: List[str],
+    rate: float,
+    seed: int,
+    timeout: float,
+) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    cold = _mark_cold(queries)
+    t0 = time.perf_counter()
+    offset = 0.0
+    tasks = []
+    for q, is_cold in zip(queries, cold):
+        offset += rng.expovariate(rate)
+        delay = t0 + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, q, t0 + offset, is_cold, timeout)))
+    return list(await asyncio.gather(*tasks))
+
+
+async def run_closed_loop(
+    client: httpx.AsyncClient,
+    queries: List[str],
+    concurrency: int,
+    timeout: float,
+) -> List[Dict[str, Any]]:
+    cold = _mark_cold(queries)
+    pending = list(zip(queries, cold))
+    pending.reverse()
+    results: List[Dict[str, Any]] = []
+
+    async def worker() -> None:
+        while pending:
+            q, is_cold = pending.pop()
+            results.append(await _send(client, q, time.perf_counter(), is_cold, timeout))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    arr = np.asarray(values)
+    return {f"p{p}": round(float(np.percentile(arr, p)), 2) for p in _PERCENTILES}
+
+
+def summarise(results: List[Dict[str, Any]], wall_s: float, cold_split: bool = False) -> Dict[str, Any]:
+    ok = [r for r in results if r["ok"]]
+    stages: Dict[str, List[float]] = {}
+    for r in ok:
+        for name, ms in r["stages"].items():
+            stages.setdefault(name, []).append(ms)
+    summary: Dict[str, Any] = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s > 0 else 0.0,
+        "latency_ms": _percentiles([r["latency_ms"] for r in ok]),
+    }
+    if cold_split:
+        summary["cold_latency_ms"] = _percentiles([r["latency_ms"] for r in ok if r["cold"]])
+        summary["warm_latency_ms"] = _percentiles([r["latency_ms"] for r in ok if not r["cold"]])
+    summary["stages_ms"] = {name: _percentiles(v) for name, v in stages.items()}
+    return summary
+
+
+def _print_summary(label: str, s: Dict[str, Any]) -> None:
+    def fmt(p: Dict[str, float]) -> str:
+        return "  ".join(f"{k}={v:.1f}" for k, v in p.items()) or "-"
+
+    print(f"\n▶ {label}")
+    print(f"  requests={s['requests']}  errors={s['errors']} ({s['error_rate']:.1%})  "
+          f"throughput={s['throughput_rps']} req/s")
+    print(f"  total    {fmt(s['latency_ms'])}")
+    if "cold_latency_ms" in s:
+        print(f"  cold     {fmt(s['cold_latency_ms'])}")
+        print(f"  warm     {fmt(s['warm_latency_ms'])}")
+    for name, p in s["stages_ms"].items():
+        print(f"  {name:8s} {fmt(p)}")
+
+
+def _in_process_client(log_file: str, seed: int, latency_scale: float) -> httpx.AsyncClient:
+    import main
+    import router.classifier
+    from models.fake_groq import load_samples, make_generate_answer
+
+    # Never append simulated rows to the traffic log being replayed.
+    router.classifier.ROUTER_LOG_FILE = REPLAY_LOG_FILE
+    main.generate_answer = make_generate_answer(
+        samples=load_samples(log_file), seed=seed, latency_scale=latency_scale,
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://replay")
+
+
+def _reset_caches() -> None:
+    from rag.ingest import clear_token_cache
+    from rag.retrieval import reload_index
+
+    clear_token_cache()
+    reload_index()      # fresh compiled index and term-id cache
+
+
+async def _run(args: argparse.Namespace, queries: List[str]) -> List[Dict[str, Any]]:
+    if args.url:
+        client = httpx.AsyncClient(
+            base_url=args.url,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+        )
+    else:
+        client = _in_process_client(args.log, args.seed, args.latency_scale)
+
+    reports: List[Dict[str, Any]] = []
+    async with client:
+        if args.rate:
+            points = [("rate", float(r)) for r in args.rate.split(",")]
+        else:
+            points = [("concurrency", int(c)) for c in args.concurrency.split(",")]
+
+        for kind, value in points:
+            if args.cold:
+                _reset_caches()
+            t0 = time.perf_counter()
+            if kind == "rate":
+                results = await run_open_loop(client, queries, value, args.seed, args.timeout)
+            else:
+                results = await run_closed_loop(client, queries, value, args.timeout)
+            summary = summarise(results, time.perf_counter() - t0, cold_split=args.cold)
+            summary[kind] = value
+            _print_summary(f"{kind}={value}", summary)
+            reports.append(summary)
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay logged traffic against /query.")
+    parser.add_argument("--log", default=ROUTER_LOG_FILE)
+    parser.add_argument("--queries", nargs="*", default=[])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--url", default=None, help="Target a running server instead of in-process.")
+    parser.add_argument("--rate", default=None, help="Comma-separated open-loop arrival rates (req/s).")
+    parser.add_argument("--concurrency", default="1", help="Comma-separated closed-loop concurrency levels.")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiply simulated LLM latency (in-process only).")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold", action="store_true",
+                        help="Reset index and tokenizer caches before each point (in-process only).")
+    parser.add_argument("--json", default=None, help="Write the reports to this file.")
+    args = parser.parse_args(argv)
+
+    if args.cold and args.url:
+        parser.error("--cold resets in-process caches and cannot be used with --url")
+
+    workload = load_workload(args.log, args.queries)
+    if not workload:
+        print(f"❌ No queries found in {args.log} or --queries files.")
+        sys.exit(1)
+    queries = [workload[i % len(workload)] for i in range(args.requests)]
+    print(f"  Replaying {len(queries)} requests ({len(set(workload))} distinct queries) "
+          f"against {args.url or 'in-process app'}")
+
+    reports = asyncio.run(_run(args, queries))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n  💾 Saved report → {args.json}")
+
+
+if __name__ == "__main__":
+    main()